@@ -0,0 +1,82 @@
+"""
+This file contains the asset cache shared by the game screens and menus.
+
+Fonts, images, sounds and rendered text surfaces are loaded once and then reused. At
+most MAX_CACHED_ASSETS assets are kept; when more are loaded, the least recently used
+asset is dropped, and is loaded again if it is needed later.
+"""
+from typing import Any, Callable, Hashable, Optional, Tuple
+from collections import OrderedDict
+import pygame as pg
+
+MAX_CACHED_ASSETS = 256
+
+
+class AssetCache:
+    """A least recently used cache of loaded assets, keyed by what they were loaded from.
+
+    Attributes
+    ----------
+    max_assets : int
+        The number of assets kept at most.
+    """
+    max_assets: int
+    _assets: OrderedDict
+
+    def __init__(self, max_assets: Optional[int] = MAX_CACHED_ASSETS) -> None:
+        self.max_assets = max_assets
+        self._assets = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._assets)
+
+    def get(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """Return the asset cached under key, loading it with loader if it is not cached"""
+        if key in self._assets:
+            self._assets.move_to_end(key)
+        else:
+            self._assets[key] = loader()
+            if len(self._assets) > self.max_assets:
+                self._assets.popitem(last=False)
+        return self._assets[key]
+
+    def clear(self) -> None:
+        """Drops all cached assets"""
+        self._assets.clear()
+
+
+_cache = AssetCache()
+
+
+def get_font(path: Optional[str], size: int) -> pg.font.Font:
+    """Return the font in the given file at the given size, or pygame's default font if
+    path is None"""
+    return _cache.get(('font', path, size), lambda: pg.font.Font(path, size))
+
+
+def get_image(path: str, alpha: Optional[bool] = True) -> pg.Surface:
+    """Return the image in the given file, converted to the pixel format of the screen"""
+    def load() -> pg.Surface:
+        image = pg.image.load(path)
+        return image.convert_alpha() if alpha else image.convert()
+    return _cache.get(('image', path, alpha), load)
+
+
+def get_sound(path: str, volume: Optional[float] = None) -> pg.mixer.Sound:
+    """Return the sound in the given file, set to the given volume"""
+    def load() -> pg.mixer.Sound:
+        sound = pg.mixer.Sound(path)
+        if volume is not None:
+            sound.set_volume(volume)
+        return sound
+    return _cache.get(('sound', path, volume), load)
+
+
+def render_text(font: pg.font.Font, text: str, color: Tuple[int, ...],
+                antialias: Optional[bool] = True) -> pg.Surface:
+    """Return the text rendered in the given font and color
+
+    The returned surface is shared, so it must not be drawn on.
+    """
+    return _cache.get(('text', font, text, tuple(color), antialias),
+                      lambda: font.render(text, antialias, color))
@@ -0,0 +1,142 @@
+"""
+Command line tools for building the game data in bulk.
+
+Example:
+    python batch.py generate --num 1000 --difficulty 3 --workers 4 --seed 111
+    python batch.py validate
+    python batch.py convert --remove-csv
+    python batch.py pack
+    python batch.py compact
+    python batch.py import-stats --csv player_stat.csv
+    python batch.py rebuild-leaderboard
+"""
+from typing import Any, List, Optional, Tuple
+from multiprocessing import Pool
+import argparse
+import os
+import random
+import time
+from map import GameMap, convert_maps, list_map_ids, release_map_ids, reserve_map_ids
+from catalogue import CATALOGUE_FILE, pack_maps
+from journal import PathJournal
+from stats import STATS_CSV, STATS_DB, PlayerStats
+from leaderboard import Leaderboard
+
+
+def _generate_map_info(task: Tuple[Tuple[int, int], int, int, int]) -> Tuple[Any, ...]:
+    """Generates a single map in a worker process, returning its object information.
+
+    Each task carries its own seed, so the generated map does not depend on which
+    worker runs it.
+    """
+    screen_size, div, difficulty, seed = task
+    new_map = GameMap(screen_size, div, True, difficulty, seed)
+    return new_map.get_object_info()
+
+
+def generate_maps(num: int, difficulty: int, workers: Optional[int] = None, seed: Optional[int] = None,
+                  screen_size: Tuple[int, int] = (800, 800), div: int = 40) -> List[int]:
+    """Generates num maps over a pool of worker processes, and saves them to 'maps/'.
+
+    Map i of the batch is generated with seed + i, so a batch can be rebuilt from
+    the same seed. The ids of the new maps are reserved before any map is written,
+    and the ids are returned.
+    """
+    if seed is None:
+        seed = random.randrange(2 ** 32)
+    tasks = [(screen_size, div, difficulty, seed + i) for i in range(num)]
+
+    start = time.perf_counter()
+    with Pool(workers) as pool:
+        results = pool.map(_generate_map_info, tasks, chunksize=max(1, num // (4 * (workers or os.cpu_count()))))
+    generated = time.perf_counter()
+
+    map_ids = reserve_map_ids(num)
+    try:
+        for map_id, (obstacle_info, fragment_info, treasure_info) in zip(map_ids, results):
+            new_map = GameMap(screen_size, div, False, difficulty)
+            new_map.set_object_info(obstacle_info, fragment_info, treasure_info)
+            new_map.write_map(map_id)
+    finally:
+        # Ids left unwritten by a failed write must not be listed as (empty) maps
+        release_map_ids(map_ids)
+    written = time.perf_counter()
+
+    print('Generated {} maps in {:.2f}s ({:.1f} maps/s), seed {}'.format(
+        num, generated - start, num / max(generated - start, 1e-9), seed))
+    print('Wrote maps {} to {} in {:.2f}s ({:.1f} maps/s overall)'.format(
+        map_ids[0] if map_ids else '-', map_ids[-1] if map_ids else '-', written - generated,
+        num / max(written - start, 1e-9)))
+    return map_ids
+
+
+def validate_maps(screen_size: Tuple[int, int] = (800, 800), div: int = 40) -> List[int]:
+    """Checks that every fragment and treasure of the maps saved in 'maps/' can be
+    reached from the start position, and returns the ids of the unsolvable maps."""
+    unsolvable = []
+    for map_id in list_map_ids():
+        game_map = GameMap(screen_size, div, False)
+        game_map.read_map('map{}'.format(map_id))
+        unreachable = game_map.get_unreachable_objects()
+        if unreachable:
+            unsolvable.append(map_id)
+            print('map{}: {} unreachable objects {}'.format(
+                map_id, len(unreachable), [tuple(rect) for rect in unreachable]))
+    print('{} unsolvable maps'.format(len(unsolvable)))
+    return unsolvable
+
+
+def main() -> None:
+    """Parses the command line arguments and runs the requested tool"""
+    parser = argparse.ArgumentParser(description='Bulk tools for the treasure hunt game data.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    generate_parser = subparsers.add_parser('generate', help='generate maps in parallel')
+    generate_parser.add_argument('--num', type=int, required=True, help='number of maps to generate')
+    generate_parser.add_argument('--difficulty', type=int, default=2, help='difficulty of the maps (1 to 5)')
+    generate_parser.add_argument('--workers', type=int, default=None,
+                                 help='number of worker processes (defaults to the number of CPUs)')
+    generate_parser.add_argument('--seed', type=int, default=None, help='seed of the first map')
+
+    subparsers.add_parser('validate', help='report maps whose objects cannot all be reached')
+
+    convert_parser = subparsers.add_parser('convert', help='convert csv maps to the binary map format')
+    convert_parser.add_argument('--remove-csv', action='store_true', help='remove each csv map once converted')
+
+    subparsers.add_parser('pack', help='pack all maps into the single-file map catalogue')
+
+    subparsers.add_parser('compact', help='compact the path journal, dropping corrupt records')
+
+    import_parser = subparsers.add_parser('import-stats', help='import player statistics from a csv file')
+    import_parser.add_argument('--csv', default=STATS_CSV, help='csv file in the format of player_stat.csv')
+
+    subparsers.add_parser('rebuild-leaderboard', help='rebuild the leaderboard from the path journal')
+
+    args = parser.parse_args()
+    if args.command == 'generate':
+        generate_maps(args.num, args.difficulty, args.workers, args.seed)
+    elif args.command == 'validate':
+        validate_maps()
+    elif args.command == 'convert':
+        converted = convert_maps(args.remove_csv)
+        print('Converted {} maps'.format(len(converted)))
+    elif args.command == 'pack':
+        start = time.perf_counter()
+        num = pack_maps()
+        print('Packed {} maps into {} in {:.2f}s'.format(num, CATALOGUE_FILE, time.perf_counter() - start))
+    elif args.command == 'compact':
+        journal = PathJournal()
+        dropped = journal.compact()
+        print('Compacted {}: kept {} records, dropped {}'.format(journal.journal_file, len(journal), dropped))
+    elif args.command == 'import-stats':
+        with PlayerStats(import_file=None) as stats:
+            num = stats.import_csv(args.csv)
+        print('Imported {} players from {} into {}'.format(num, args.csv, STATS_DB))
+    elif args.command == 'rebuild-leaderboard':
+        with Leaderboard() as leaderboard:
+            num = leaderboard.rebuild(PathJournal())
+        print('Rebuilt the leaderboard from {} games'.format(num))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+"""
+This file contains the map catalogue, which packs many game maps into a single file.
+
+The catalogue starts with a header and a table of (map_id, offset, length) entries,
+sorted by map id, followed by each map in the binary map format (see GameMap.to_bytes).
+The file is memory-mapped, so reading one map only touches its table entry and its
+own bytes.
+"""
+from __future__ import annotations
+from typing import Any, List, Optional, Tuple
+import mmap
+import os
+import struct
+import numpy as np
+from map import GameMap, MAP_DIR, list_map_ids
+
+CATALOGUE_FILE = os.path.join(MAP_DIR, 'maps.tcat')
+CATALOGUE_MAGIC = b'TCAT'
+CATALOGUE_VERSION = 1
+CATALOGUE_HEADER = struct.Struct('<4sHI')
+CATALOGUE_ENTRY = np.dtype([('map_id', '<u4'), ('offset', '<u8'), ('length', '<u4')])
+
+
+class MapCatalogue:
+    """A read-only catalogue of game maps, opened through mmap.
+
+    Attributes
+    ----------
+    screen_size : Tuple[int, int]
+        The screen size the maps are built for.
+    div : int
+        The grid division the maps are built for.
+    """
+    screen_size: Tuple[int, int]
+    div: int
+    _file: Any
+    _mmap: mmap.mmap
+    _entries: np.ndarray
+
+    def __init__(self, catalogue_file: Optional[str] = CATALOGUE_FILE,
+                 screen_size: Tuple[int, int] = (800, 800), div: int = 40) -> None:
+        """Opens the catalogue saved in catalogue_file
+
+        Raise a ValueError if the file is not a map catalogue.
+        """
+        self.screen_size = screen_size
+        self.div = div
+        self._file = open(catalogue_file, 'rb')
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, count = CATALOGUE_HEADER.unpack_from(self._mmap)
+        if magic != CATALOGUE_MAGIC or version != CATALOGUE_VERSION:
+            self.close()
+            raise ValueError('Not a version {} map catalogue'.format(CATALOGUE_VERSION))
+        # The table is a view of the mapped file, so it is not read until it is searched
+        self._entries = np.frombuffer(self._mmap, dtype=CATALOGUE_ENTRY, count=count,
+                                      offset=CATALOGUE_HEADER.size)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, map_id: int) -> bool:
+        return self._find(map_id) is not None
+
+    def __enter__(self) -> MapCatalogue:
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def map_ids(self) -> List[int]:
+        """Return the ids of all maps in the catalogue, in increasing order"""
+        return self._entries['map_id'].tolist()
+
+    def get_map(self, map_id: int) -> GameMap:
+        """Return the map with the given id, reading only its own bytes
+
+        Raise a KeyError if the map is not in the catalogue.
+        """
+        index = self._find(map_id)
+        if index is None:
+            raise KeyError(map_id)
+        entry = self._entries[index]
+        offset, length = int(entry['offset']), int(entry['length'])
+
+        game_map = GameMap(self.screen_size, self.div, False)
+        game_map.load_bytes(self._mmap[offset:offset + length])
+        game_map.set_id(map_id)
+        return game_map
+
+    def close(self) -> None:
+        """Closes the catalogue file"""
+        # The table view must be released before the mmap can be closed
+        self._entries = np.empty(0, dtype=CATALOGUE_ENTRY)
+        self._mmap.close()
+        self._file.close()
+
+    def _find(self, map_id: int) -> Optional[int]:
+        """Return the index of the map in the entry table, using a binary search over
+        the sorted map ids"""
+        index = int(np.searchsorted(self._entries['map_id'], map_id))
+        if index < len(self._entries) and self._entries[index]['map_id'] == map_id:
+            return index
+        return None
+
+
+def read_catalogue_ids(catalogue_file: Optional[str] = CATALOGUE_FILE) -> List[int]:
+    """Return the ids of the maps packed in catalogue_file, in increasing order, or an
+    empty list if there is no catalogue"""
+    if not os.path.exists(catalogue_file):
+        return []
+    with MapCatalogue(catalogue_file) as catalogue:
+        return catalogue.map_ids()
+
+
+def pack_maps(catalogue_file: Optional[str] = CATALOGUE_FILE,
+              screen_size: Tuple[int, int] = (800, 800), div: int = 40) -> int:
+    """Packs every map saved under directory 'maps' into a single catalogue file, and
+    returns the number of maps packed.
+
+    The catalogue is written to a temporary file first, and then replaces the old
+    catalogue in one step.
+    """
+    map_ids = list_map_ids()
+    records = []
+    for map_id in map_ids:
+        game_map = GameMap(screen_size, div, False)
+        game_map.read_map('map{}'.format(map_id))
+        records.append(game_map.to_bytes())
+
+    entries = np.zeros(len(map_ids), dtype=CATALOGUE_ENTRY)
+    offset = CATALOGUE_HEADER.size + entries.nbytes
+    for i, (map_id, record) in enumerate(zip(map_ids, records)):
+        entries[i] = (map_id, offset, len(record))
+        offset += len(record)
+
+    temp_file = catalogue_file + '.tmp'
+    with open(temp_file, 'wb') as file:
+        file.write(CATALOGUE_HEADER.pack(CATALOGUE_MAGIC, CATALOGUE_VERSION, len(map_ids)))
+        file.write(entries.tobytes())
+        for record in records:
+            file.write(record)
+    os.replace(temp_file, catalogue_file)
+    return len(map_ids)
@@ -1,10 +1,82 @@
 """This file contains the main game"""
-from typing import List, Tuple, Optional
+from typing import Any, Callable, Dict, List, NamedTuple, Set, Tuple, Optional
+from collections import OrderedDict
+from collections.abc import Sequence
 from player import Player
-from map import GameMap
-from path import Path
+from map import GameMap, get_map_mtimes
+from catalogue import CATALOGUE_FILE, MapCatalogue
+from path import Path, CompactGraph, list_path_files, read_path_header
+from journal import JournalEntry, PathJournal
+from session import SessionRecorder, archive_session, discard_session, read_session
+from leaderboard import Leaderboard
+from assets import AssetCache
+import logging
 import os
 
+logger = logging.getLogger(__name__)
+
+# Upper bounds on the number of maps and paths kept loaded at once
+MAX_LOADED_MAPS = 32
+MAX_LOADED_PATHS = 256
+# Upper bound on the number of general paths kept built at once
+MAX_GENERAL_PATHS = 32
+
+# General paths are kept across Game instances, as a new Game is read after every win
+_general_paths = AssetCache(MAX_GENERAL_PATHS)
+
+
+class PathEntry(NamedTuple):
+    """Index entry of a saved path, holding what is needed to find it without loading it"""
+    path_id: int
+    map_id: int
+    player_id: str
+    path_file: Optional[str]
+    journal_entry: Optional[JournalEntry] = None
+
+
+class LazyList(Sequence):
+    """A read-only list whose items are loaded from their index entries on first access.
+
+    At most max_loaded items are kept in memory. When more are loaded, the least
+    recently used item is dropped, and is loaded again if it is accessed later.
+    """
+    _entries: List[Any]
+    _loader: Callable[[Any], Any]
+    _cache: OrderedDict
+    _max_loaded: int
+
+    def __init__(self, entries: List[Any], loader: Callable[[Any], Any], max_loaded: int) -> None:
+        self._entries = entries
+        self._loader = loader
+        self._cache = OrderedDict()
+        self._max_loaded = max_loaded
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __getitem__(self, index: int) -> Any:
+        if index < 0:
+            index += len(self._entries)
+        if not 0 <= index < len(self._entries):
+            raise IndexError(index)
+
+        if index in self._cache:
+            self._cache.move_to_end(index)
+        else:
+            self._cache[index] = self._loader(self._entries[index])
+            if len(self._cache) > self._max_loaded:
+                self._cache.popitem(last=False)
+        return self._cache[index]
+
+    def get_entries(self) -> List[Any]:
+        """Return the index entries of all items, without loading them"""
+        return self._entries
+
+    def add_entry(self, entry: Any) -> int:
+        """Adds the index entry of a new item at the end, and returns its index"""
+        self._entries.append(entry)
+        return len(self._entries) - 1
+
 
 class Game:
     """Game Class
@@ -15,32 +87,157 @@ class Game:
     path: Path
     player: Player
     game_map: GameMap
-    map_list: List[GameMap]
-    path_list: List[Path]
+    map_list: Sequence[GameMap]
+    path_list: Sequence[Path]
+    journal: Optional[PathJournal]
+    unfinished_path: Optional[Path]
+    record_session: bool
+    _recorder: Optional[SessionRecorder]
+    _map_positions: Dict[int, int]
+    _map_path_indices: Dict[int, List[int]]
+    _catalogue: Optional[MapCatalogue]
+    _newer_map_ids: Set[int]
     player_list: List[Player]
     screen_size: Tuple[int, int]
     player_rect: Tuple[int, int]
     div: int
 
-    def __init__(self, screen_size: Optional[Tuple[int, int]] = (800, 800), div: Optional[int] = 40):
-        """Initializes game instance."""
+    def __init__(self, screen_size: Optional[Tuple[int, int]] = (800, 800), div: Optional[int] = 40,
+                 record_session: Optional[bool] = True):
+        """Initializes game instance.
+
+        If record_session is True, the moves of each game are streamed to the session
+        file while it is played (see SessionRecorder).
+        """
         self.player_rect = (8, 8)
         self.screen_size = screen_size
         self.div = div
         self.map_list = []
         self.path_list = []
+        self.journal = None
+        self.unfinished_path = None
+        self.record_session = record_session
+        self._recorder = None
+        self._map_positions = {}
+        self._map_path_indices = {}
+        self._catalogue = None
+        self._newer_map_ids = set()
         self.player = Player('Default')
 
     def set_map(self, map_id):
-        """Set the current map given the map index"""
-        assert map_id < len(self.map_list)
-        self.game_map = self.map_list[map_id - 1]
+        """Set the current map given the map id"""
+        self.game_map = self.get_map(map_id)
+
+    def get_map(self, map_id: int) -> GameMap:
+        """Return the map with the given id
+
+        Map ids can have gaps, so the map is found through the id index built by read.
+        Raise a KeyError if there is no map with the given id.
+        """
+        return self.map_list[self._map_positions[map_id]]
+
+    def has_map(self, map_id: int) -> bool:
+        """Return whether there is a map with the given id"""
+        return map_id in self._map_positions
 
     def reset_path(self):
         """Resets the current path of the game"""
-        pos = (int(self.screen_size[0] / self.div - self.player_rect[0] / 2),
-               int(self.screen_size[1] / 2 - self.player_rect[1] / 2))
+        pos = self.game_map.get_start_pos(self.player_rect)
         self.path = Path(initial_pos=pos, map_id=self.game_map.map_id, player_id=self.player.player_id)
+        self._record_path()
+
+    def resume_session(self) -> bool:
+        """Continues the unfinished game recovered from the session file, and returns
+        whether it was resumed.
+
+        The fragments and treasures found in the unfinished game are found again by
+        replaying its moves. A game played by another player, or on a map that no
+        longer exists, is archived instead (see archive_session), and a game that was
+        already won is saved to the path journal.
+        """
+        path, self.unfinished_path = self.unfinished_path, None
+        if path is None:
+            return False
+        if path.get_player() != self.player.player_id or not self.has_map(path.get_map()):
+            archive_session(path)
+            self._discard_session()
+            return False
+
+        self.set_map(path.get_map())
+        self.game_map.reset()
+        self.player.reset()
+        for pos in path.pos_record[1:]:
+            treasure = self.game_map.treasure_at(pos, self.player_rect)
+            if treasure is not None and self.player.backpack['fragments'] >= 3:
+                self.game_map.remove_treasure(treasure)
+                self.player.update_backpack('treasures', 1)
+                self.player.update_backpack('fragments', -3)
+            fragment = self.game_map.fragment_at(pos, self.player_rect)
+            if fragment is not None:
+                self.game_map.remove_fragment(fragment)
+                self.player.update_backpack('fragments', 1)
+
+        self.path = path
+        if self.player.backpack['treasures'] == self.game_map.get_difficulty():
+            self.record_win()
+            self._discard_session()
+            self.game_map.reset()
+            self.player.reset()
+            self.reset_path()
+            return False
+        self._record_path()
+        return True
+
+    def abandon_path(self) -> None:
+        """Archives the current path when its game is left unfinished (see archive_session)"""
+        if self.path.move_count > 0:
+            archive_session(self.path)
+        if self._recorder is not None:
+            self._recorder.finish()
+
+    def close(self) -> None:
+        """Writes the remaining recorded moves, and stops recording"""
+        if self._recorder is not None:
+            self._recorder.close()
+            self._recorder = None
+
+    def _discard_session(self) -> None:
+        """Removes the session file, once the unfinished game recorded in it is saved elsewhere"""
+        if self._recorder is not None:
+            # The recorder removes it after the moves it is still writing
+            self._recorder.finish()
+        else:
+            discard_session()
+
+    def _record_path(self) -> None:
+        """Streams the moves of the current path to the session file"""
+        if not self.record_session:
+            return
+        if self._recorder is None:
+            self._recorder = SessionRecorder()
+        self.path.set_recorder(self._recorder.record)
+        self._recorder.start(self.path)
+
+    def get_general_path(self, map_id: int, rect_size: Tuple[int, int],
+                         weighted: Optional[bool] = False) -> Path:
+        """Returns the path traversing through all possible routes of the given map.
+
+        The general path only depends on the map layout, so it is built once per layout
+        and reused on later calls, also by later Game instances. It is always built from
+        the map with all of its objects in place, so treasures already opened in the
+        current game do not leave walkable cells in it. A weighted general path also
+        crosses terrain that has a movement cost (see GameMap.get_terrain_costs).
+        """
+        game_map = self.get_map(map_id)
+
+        def build() -> Path:
+            pos = (int(self.screen_size[0] / self.div - rect_size[0] / 2),
+                   int(self.screen_size[1] / 2 - rect_size[1] / 2))
+            graph = CompactGraph.for_grid(self.screen_size, self.div, rect_size)
+            general_path = Path(initial_pos=pos, map_id=map_id, graph=graph)
+            general_path.set_general_paths(game_map.copy_layout(), rect_size, weighted)
+            return general_path
+        return _general_paths.get((map_id, game_map.fingerprint(), tuple(rect_size), weighted), build)
 
     def generate_maps(self, num: int, difficulty: int) -> None:
         """Generates a set number of maps, which are saved to 'maps/'"""
@@ -52,34 +249,122 @@ class Game:
         self.player_list.append(player_id)
 
     def read(self) -> None:
-        """Read from all data"""
-        map_num = len([m for m in os.listdir('maps/')])
-        path_num = len([m for m in os.listdir('paths/')])
-        # Reading game maps
-        if map_num != 0:
-            for i in range(1, map_num + 1):
-                map_name = 'map{}'.format(i)
-
-                new_map = GameMap(self.screen_size, self.div, False)
-                new_map.read_map(map_name)
-                self.map_list.append(new_map)
-
-        # Reading paths
-        if path_num != 0:
-            for i in range(1, path_num + 1):
-                path_name = 'path{}.csv'.format(i)
-                path_dir = os.path.join(r'paths\\', path_name)
-
-                pos = (int(self.screen_size[0] / self.div - self.player_rect[0] / 2),
-                       int(self.screen_size[1] / 2 - self.player_rect[1] / 2))
-
-                new_path = Path(initial_pos=pos)
-                new_path.read_path(path_dir)
-                self.path_list.append(new_path)
+        """Read from all data
+
+        Only an index of the maps and paths is read here. map_list and path_list load
+        each map or path on first access (see LazyList).
+        """
+        map_mtimes = get_map_mtimes()
+        map_ids = sorted(map_mtimes)
+        # Maps packed in the catalogue are read from it, the others from their own files.
+        # Maps written after the catalogue was packed are also read from their own files.
+        if os.path.exists(CATALOGUE_FILE):
+            self._catalogue = MapCatalogue(CATALOGUE_FILE, self.screen_size, self.div)
+            catalogue_mtime = os.path.getmtime(CATALOGUE_FILE)
+            self._newer_map_ids = {map_id for map_id, mtime in map_mtimes.items() if mtime > catalogue_mtime}
+            map_ids = sorted(set(map_ids).union(self._catalogue.map_ids()))
+        self.map_list = LazyList(map_ids, self._load_map, MAX_LOADED_MAPS)
+        self._map_positions = {map_id: i for i, map_id in enumerate(map_ids)}
+
+        # Reading the player and map of each path saved in its own file
+        path_entries = []
+        for path_id, path_file in list_path_files():
+            player_id, map_id = read_path_header(path_file)
+            path_entries.append(PathEntry(path_id, map_id, player_id, path_file))
+        self.path_list = LazyList(path_entries, self._load_path, MAX_LOADED_PATHS)
+        self._map_path_indices = {}
+        for i, entry in enumerate(path_entries):
+            self._map_path_indices.setdefault(entry.map_id, []).append(i)
+
+        # Finished games are saved in the journal, which is indexed on its own
+        self.journal = PathJournal()
+        if self.journal.needs_compaction():
+            self.journal.compact()
+        for journal_entry in self.journal.get_entries():
+            self._add_journal_entry(journal_entry)
+
+        # A game left unfinished by a crash or by quitting is resumed or archived on start
+        self.unfinished_path = read_session() if self.record_session else None
+
+    def record_win(self) -> None:
+        """Saves the current path and records the finished game in the player statistics
+        and the leaderboard
+
+        The statistics and the leaderboard are updated in one transaction (see
+        Leaderboard.record_win).
+        """
+        with Leaderboard() as leaderboard:
+            leaderboard.record_win(self.player.player_id, self.player.get_vision_radius(),
+                                   self.game_map.get_difficulty(), self.game_map.map_id, self.path.move_count)
+        self.save_path()
+
+    def save_path(self) -> None:
+        """Saves the current path as a new record of the path journal"""
+        if self.journal is None:
+            self.journal = PathJournal()
+        self._add_journal_entry(self.journal.append(self.path))
+        if self._recorder is not None:
+            self._recorder.finish()
+
+    def get_map_paths(self, map_id: int, limit: Optional[int] = None) -> List[Path]:
+        """Return the saved paths on the given map, only loading those paths
+
+        If limit is given, only the first limit paths are returned and loaded. Paths whose
+        record is corrupt are skipped; they are dropped when the journal is compacted.
+        """
+        paths = []
+        for i in self._map_path_indices.get(map_id, []):
+            if limit is not None and len(paths) >= limit:
+                break
+            try:
+                paths.append(self.path_list[i])
+            except ValueError as error:
+                logger.warning('Skipping saved path %d: %s', self.path_list.get_entries()[i].path_id, error)
+        return paths
+
+    def _add_journal_entry(self, journal_entry: JournalEntry) -> None:
+        """Adds a record of the path journal to path_list"""
+        if not isinstance(self.path_list, LazyList):
+            self.path_list = LazyList([], self._load_path, MAX_LOADED_PATHS)
+        entries = self.path_list.get_entries()
+        path_id = (entries[-1].path_id if entries else 0) + 1
+        index = self.path_list.add_entry(PathEntry(path_id, journal_entry.map_id, journal_entry.player_id,
+                                                   None, journal_entry))
+        self._map_path_indices.setdefault(journal_entry.map_id, []).append(index)
+
+    def get_map_ids(self) -> List[int]:
+        """Return the ids of all maps, in increasing order, without loading the maps"""
+        return list(self._map_positions)
+
+    def _load_map(self, map_id: int) -> GameMap:
+        """Loads the map with the given id, from the catalogue if it is packed there and
+        its own file is not newer"""
+        if self._catalogue is not None and map_id in self._catalogue and map_id not in self._newer_map_ids:
+            return self._catalogue.get_map(map_id)
+        new_map = GameMap(self.screen_size, self.div, False)
+        new_map.read_map('map{}'.format(map_id))
+        return new_map
+
+    def _load_path(self, entry: PathEntry) -> Path:
+        """Loads the path described by the given index entry"""
+        pos = (int(self.screen_size[0] / self.div - self.player_rect[0] / 2),
+               int(self.screen_size[1] / 2 - self.player_rect[1] / 2))
+
+        # Recorded paths are kept in compact graphs, as many of them stay loaded
+        graph = CompactGraph.for_grid(self.screen_size, self.div, self.player_rect)
+        new_path = Path(initial_pos=pos, graph=graph)
+        if entry.journal_entry is not None:
+            new_path.load_bytes(self.journal.read(entry.journal_entry))
+        else:
+            new_path.read_path(entry.path_file)
+        new_path.path_id = entry.path_id
+        return new_path
 
     def write(self) -> None:
         """Writes all data into file"""
         for game_map in self.map_list:
-            game_map.write_map()
-        for path in self.path_list:
-            path.write_path()
+            game_map.write_map(game_map.map_id)
+        # Paths in the journal are already saved
+        for i, entry in enumerate(self.path_list.get_entries()):
+            if entry.journal_entry is None:
+                self.path_list[i].write_path()
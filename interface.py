@@ -5,10 +5,12 @@ interface for the game.
 from game import Game
 import pygame as pg
 from pygame.locals import *
-from typing import Tuple
+from typing import List, Optional, Tuple
 import menu
 from path import Path
 from player import Player
+from render import DirtyTracker, FogOfWar, PathOverlay, StaticLayers
+import assets
 import copy
 
 
@@ -17,37 +19,40 @@ class GameDisplay:
     screen: pg.Surface
     clock: pg.time.Clock
     msg_font: pg.font.Font
+    layers: StaticLayers
+    fog: FogOfWar
+    dirty: Optional[DirtyTracker]
 
-    def __init__(self, screen_size: Tuple[int, int]):
+    def __init__(self, screen_size: Tuple[int, int], dirty_rects: Optional[bool] = False):
+        """Initializes the game display.
+
+        If dirty_rects is True, each frame of the game only pushes the changed regions of
+        the screen to the display (see DirtyTracker), instead of the whole screen.
+        """
         # Initializes PyGame Modules
         pg.init()
 
         self.screen_size = screen_size
         self.screen = pg.display.set_mode(screen_size)
         self.clock = pg.time.Clock()
-        self.msg_font = pg.font.Font(None, 30)
+        self.msg_font = assets.get_font(None, 30)
+        self.layers = StaticLayers(screen_size)
+        self.fog = FogOfWar(self.layers)
+        self.dirty = DirtyTracker((8, 8)) if dirty_rects else None
 
     def draw_grid(self, div: int) -> None:
-        """Draws a square grid on the given surface.
+        """Draws a square grid on the screen.
 
-        The drawn grid has GRID_SIZE columns and rows.
+        The drawn grid has div columns and rows. It is only drawn once, and then
+        blitted from the cached grid layer.
         """
-        color = (255, 255, 255)
-        width, height = self.screen.get_size()
-
-        for col in range(1, div):
-            x = col * (width // div)
-            pg.draw.line(self.screen, color, (x, 0), (x, height))
-
-        for row in range(1, div):
-            y = row * (height // div)
-            pg.draw.line(self.screen, color, (0, y), (width, y))
+        self.screen.blit(self.layers.get_grid(div), (0, 0))
 
     def message(self, text: str, font: pg.font, color: Tuple[int, ...], center_pos: Tuple[int, int]):
         pg.font.init()
 
-        # Creates text object
-        text_render = font.render(text, True, color)
+        # Creates text object, which is only rendered the first time it is shown
+        text_render = assets.render_text(font, text, color)
         text_rect = text_render.get_rect()
         text_rect.center = center_pos
 
@@ -76,12 +81,33 @@ class GameDisplay:
             if delay <= 0:
                 text_off = True
 
-    def show_score(self, game: Game):
-        treasures = self.msg_font.render('Treasures:' + str(game.player.backpack['treasures']), True, (255, 255, 255))
-        fragments = self.msg_font.render('Fragments:' + str(game.player.backpack['fragments']), True, (255, 255, 255))
-
-        self.screen.blit(treasures, (50, 20))
-        self.screen.blit(fragments, (50, 50))
+    def show_score(self, game: Game) -> List[pg.Rect]:
+        """Displays the current number of treasures and fragments, and returns the regions drawn"""
+        treasures = assets.render_text(self.msg_font, 'Treasures:' + str(game.player.backpack['treasures']),
+                                       (255, 255, 255))
+        fragments = assets.render_text(self.msg_font, 'Fragments:' + str(game.player.backpack['fragments']),
+                                       (255, 255, 255))
+
+        return [self.screen.blit(treasures, (50, 20)), self.screen.blit(fragments, (50, 50))]
+
+    def collect_fragment(self, game: Game, pos: Tuple[int, int], rect_size: Tuple[int, int],
+                         sound: pg.mixer.Sound) -> None:
+        """Collects the fragment the player stands on at pos, if there is one"""
+        fragment = game.game_map.fragment_at(pos, rect_size)
+        if fragment is not None:
+            sound.play()
+            # remove collided fragment from the map
+            if self.dirty is not None:
+                self.dirty.add(fragment)
+            game.game_map.remove_fragment(fragment)
+            game.player.update_backpack('fragments', 1)
+
+    def update_display(self) -> None:
+        """Pushes the frame to the display, only in the changed regions if dirty rects are tracked"""
+        if self.dirty is None:
+            pg.display.flip()
+        else:
+            self.dirty.update()
 
     def game_end(self, num_steps: int):
         game_exit = False
@@ -129,7 +155,8 @@ class GameDisplay:
         treasures_copy = []
         # Create Game Menu Objects
         name_entry = menu.NameEntry(self.screen_size, self.screen)
-        settings_menu = menu.Settings(self.screen_size, self.screen)
+        settings_menu = menu.Settings(self.screen_size, self.screen, game.get_map_ids())
+        leaderboard_menu = menu.LeaderboardMenu(self.screen_size, self.screen)
         main_menu = menu.MainMenu(self.screen_size, self.screen)
         pause = menu.Pause(self.screen_size, self.screen)
 
@@ -140,8 +167,11 @@ class GameDisplay:
 
         map_paths = []
         general_path = Path((0, 0))
+        all_path_overlay = PathOverlay(self.screen_size, rect_size)
+        general_path_overlay = PathOverlay(self.screen_size, rect_size)
+        player_path_overlay = PathOverlay(self.screen_size, rect_size)
         # Sets default map and path
-        game.set_map(1)
+        game.set_map(settings_menu.map_id)
         game.reset_path()
 
         # Initializes empty path list for the current map
@@ -154,18 +184,17 @@ class GameDisplay:
         pg.mixer.music.set_volume(0.03)
         pg.mixer.music.play(-1)
         # river_sound =
-        rock_sound = pg.mixer.Sound('music/rock.mp3')
-        rock_sound.set_volume(0.1)
-        treasure_sound = pg.mixer.Sound('music/treasure.wav')
-        treasure_sound.set_volume(0.1)
-        fragment_sound = pg.mixer.Sound('music/fragment.mp3')
-        fragment_sound.set_volume(0.1)
+        rock_sound = assets.get_sound('music/rock.mp3', 0.1)
+        treasure_sound = assets.get_sound('music/treasure.wav', 0.1)
+        fragment_sound = assets.get_sound('music/fragment.mp3', 0.1)
 
         shortest_path_rect = []
+        score_rects = []
 
         while not exit_game:
             name_on = not player_set
             settings_on = False
+            leaderboard_on = False
 
             name_input = name_entry.display(name_on)
             if not player_set:
@@ -182,9 +211,16 @@ class GameDisplay:
 
             main_option = main_menu.display(menu_on)
             if main_option == 'Start':
-                game.reset_path()
+                # Continues the game left unfinished in the last session, if there is one
+                if game.resume_session():
+                    if game.game_map.map_id != settings_menu.map_id:
+                        # The saved paths and general path of the resumed map are imported anew
+                        paths_import = False
+                        settings_menu.set_map_id(game.game_map.map_id)
+                else:
+                    game.reset_path()
 
-                rect_pos = game.path.initial_pos
+                rect_pos = game.path.pos_record[-1]
 
                 player_rect = pg.Rect(rect_pos, rect_size)
 
@@ -193,6 +229,8 @@ class GameDisplay:
                 main_menu.return_option = ''
             elif main_option == 'Settings':
                 settings_on = True
+            elif main_option == 'Leaderboard':
+                leaderboard_on = True
             elif main_option == 'Quit':
                 exit_game = True
             else:
@@ -205,6 +243,8 @@ class GameDisplay:
             map_id = settings_menu.map_id
             current_mode = settings_menu.mode
 
+            leaderboard_menu.display(leaderboard_on, game.player.player_id, map_id)
+
             # Sets game map id given by settings
             game.set_map(map_id)
             game.path.set_map(map_id)
@@ -212,30 +252,20 @@ class GameDisplay:
             h_step, v_step = game.game_map.get_step()
 
             if not paths_import:
-                map_paths = []
-                for path_ in game.path_list:
-                    if path_.get_map() == map_id:
-                        map_paths.append(path_)
+                # Only the paths drawn with their own color are loaded
+                map_paths = game.get_map_paths(map_id, len(paths_colors) - 1)
                 paths_import = True
 
-                # Generate the general path for the current map. This may slow down performance
-                general_path = Path(initial_pos=(int(self.screen_size[0] / 40 - rect_size[0] / 2),
-                                                 int(self.screen_size[1] / 2 - rect_size[1] / 2)))
-                general_path.set_map(map_id)
-                general_path.set_general_paths(game.map_list[map_id-1], rect_size)
+                # Retrieves the general path for the current map, which is only built once per map
+                general_path = game.get_general_path(map_id, rect_size)
 
             # Obtains game objects from the map
-            obstacle_list_type = [(x[0], x[1]) for x in game.game_map.get_obstacles()]
-            obstacle_list = [x[0] for x in game.game_map.get_obstacles()]
             treasure_list = game.game_map.get_treasures()
             if not treasures_copied:
                 treasures_copy = copy.deepcopy(treasure_list)
                 treasures_copied = True
             fragment_list = game.game_map.get_fragments()
 
-            # Retrieves object types and their relevant information
-            object_type = game.game_map.get_object_types()
-
             # Change in position according to movement event
             dir_key = {K_LEFT: (-h_step, 0), K_RIGHT: (h_step, 0), K_UP: (0, -v_step), K_DOWN: (0, v_step)}
             # Assign keys to movement names
@@ -245,25 +275,13 @@ class GameDisplay:
 
             # Game window
             if game_start:
-                # Checks for possible movements given obstacles in the current map
-                possible_movements = ['left', 'right', 'up', 'down']
-                margins = [0, 800]
-                available_movements = []
-                for move in possible_movements:
-                    new_pos = next_pos(rect_pos, move, h_step, v_step)
-                    center_pos = [new_pos[0] + rect_size[0] / 2, new_pos[1] + rect_size[1] / 2]
-                    new_rect = pg.Rect(new_pos, rect_size)
-                    if new_rect.collidelist(obstacle_list) == -1 and \
-                            all(x not in margins for x in center_pos):
-                        available_movements.append(move)
-
                 treasure_obtainable = True
                 for event in pg.event.get():
                     if event.type == QUIT:
                         exit_game = True
                         pg.quit()
 
-                    if current_mode == 'Shortest Path':
+                    if current_mode in ('Shortest Path', 'A* Search'):
                         if player_rect.collidelist(treasures_copy) == -1:
                             shortest_path = []
                             # Utilizes Shortest Path function
@@ -273,7 +291,20 @@ class GameDisplay:
                                     if fragment.collidepoint(pg.mouse.get_pos()):
                                         final_pos = (int(fragment.centerx - rect_size[0] / 2),
                                                      int(fragment.centery - rect_size[1] / 2))
-                                        shortest_path = general_path.shortest_path(init_pos, final_pos)
+                                        if current_mode == 'A* Search':
+                                            # A* may cross terrain with a movement cost, such as rivers
+                                            weighted_path = game.get_general_path(map_id, rect_size, True)
+                                            try:
+                                                shortest_path = weighted_path.a_star(init_pos, final_pos,
+                                                                                     (h_step, v_step)) or []
+                                            except ValueError:
+                                                shortest_path = []
+                                        else:
+                                            # A fragment whose cell the player cannot stand on has no path
+                                            try:
+                                                shortest_path = general_path.shortest_path(init_pos, final_pos) or []
+                                            except ValueError:
+                                                shortest_path = []
                                 for pos in shortest_path:
                                     path_rect_pos = (pos[0] + 2, pos[1] + 2)
                                     path_rect = pg.Rect(path_rect_pos, (4, 4))
@@ -283,12 +314,18 @@ class GameDisplay:
                                     player_rect.move_ip(pos_change)
                                     game.path.update_path((int(rect_pos[0]), int(rect_pos[1])))
                                     init_pos = rect_pos
+                                if shortest_path:
+                                    self.collect_fragment(game, player_rect.topleft, rect_size, fragment_sound)
 
                     if event.type == KEYDOWN:
-                        if event.key in dir_key and dir_name[event.key] not in available_movements:
+                        # Checks if the movement is possible given obstacles in the current map, from
+                        # the movement mask precomputed for the map
+                        move_possible = event.key in dir_key and \
+                            game.game_map.can_move(rect_pos, dir_name[event.key], rect_size)
+                        if event.key in dir_key and not move_possible:
                             rock_sound.play()
                         # Assign rectangle movements according to key event if movement is valid
-                        if event.key in dir_key and dir_name[event.key] in available_movements:
+                        if move_possible:
                             event_key = event.key
 
                             pos_change = dir_key[event.key]
@@ -297,13 +334,15 @@ class GameDisplay:
 
                             # Checks for fragment and treasure collision
                             # Treasure Collision
-                            treasure_collision_index = player_rect.collidelist(treasure_list)
-                            if treasure_collision_index != -1:
+                            treasure = game.game_map.treasure_at(player_rect.topleft, rect_size)
+                            if treasure is not None:
                                 # With at least 3 fragments on treasure collision
                                 if game.player.backpack['fragments'] >= 3:
                                     treasure_sound.play()
-                                    # Remove collided treasure from list
-                                    del treasure_list[treasure_collision_index]
+                                    # Remove collided treasure from the map
+                                    if self.dirty is not None:
+                                        self.dirty.add(treasure)
+                                    game.game_map.remove_treasure(treasure)
                                     game.player.update_backpack('treasures', 1)
                                     game.player.update_backpack('fragments', -3)
                                 # Not enough fragments on treasure collision
@@ -315,9 +354,13 @@ class GameDisplay:
                                     player_rect.move_ip(pos_change)
                                     # Prints info message
                                     self.not_enough_fragment()
+                                    if self.dirty is not None:
+                                        self.dirty.invalidate()
 
                             if treasure_obtainable:
                                 game.path.update_path((int(rect_pos[0]), int(rect_pos[1])))
+                                # Fragment Collision, only checked when the player has moved
+                                self.collect_fragment(game, player_rect.topleft, rect_size, fragment_sound)
 
                         if event.key == K_f:
                             show_all = not show_all
@@ -337,46 +380,32 @@ class GameDisplay:
                         if event.key == K_h:
                             draw_general_path = not draw_general_path
 
-                # Fragment Collision
-                fragment_collision_index = player_rect.collidelist(fragment_list)
-                if fragment_collision_index != -1:
-                    fragment_sound.play()
-                    # remove collided fragment from list
-                    del fragment_list[fragment_collision_index]
-                    game.player.update_backpack('fragments', 1)
-
-                # Fills screen
-                self.screen.fill((248, 186, 182))
-
                 # Sets color for fragment and treasures
                 treasure_color = pg.Color('#fdcc33')
                 fragment_color = pg.Color('#f25805')
 
                 if show_all:
-                    # Draws all game objects onto screen if show_all is True
-                    for o in obstacle_list_type:
-                        pg.draw.rect(self.screen, object_type[o[1]][0], o[0])
+                    # Draws all game objects onto screen if show_all is True, with the obstacles
+                    # from the cached background layer
+                    self.screen.blit(self.layers.get_background(game.game_map, True), (0, 0))
                     for treasure in treasure_list:
                         pg.draw.rect(self.screen, treasure_color, treasure)
                     for fragment in fragment_list:
                         pg.draw.rect(self.screen, fragment_color, fragment)
                 else:
-                    # Otherwise, utilizes vision field function
-                    path_pos = game.path.all_pos
-
-                    vision_rect_size = (rect_size[0] + 2 * vision_radius, rect_size[1] + 2 * vision_radius)
-                    vision_rect_pos = [(pos[0] - vision_radius, pos[1] - vision_radius) for pos in path_pos]
+                    # Otherwise, utilizes vision field function, which only tests the newly
+                    # visited positions against the game objects
+                    revealed_rects = self.fog.update(game.game_map, game.path, vision_radius, rect_size)
+                    if self.dirty is not None:
+                        for rect in revealed_rects:
+                            self.dirty.add(rect)
+                    self.screen.blit(self.fog.get_surface(), (0, 0))
 
-                    vision_rects = [pg.Rect(pos, vision_rect_size) for pos in vision_rect_pos]
-
-                    for o in obstacle_list_type:
-                        if o[0].collidelist(vision_rects) != -1:
-                            pg.draw.rect(self.screen, object_type[o[1]][0], o[0])
                     for treasure in treasure_list:
-                        if treasure.collidelist(vision_rects) != -1:
+                        if self.fog.is_revealed(treasure):
                             pg.draw.rect(self.screen, treasure_color, treasure)
                     for fragment in fragment_list:
-                        if fragment.collidelist(vision_rects) != -1:
+                        if self.fog.is_revealed(fragment):
                             pg.draw.rect(self.screen, '#ea4915', fragment)
 
                 # Adds grid to the screen
@@ -390,6 +419,7 @@ class GameDisplay:
 
                 if pause.display(is_paused) == 'exit':
                     player_rect.topleft = game.path.initial_pos
+                    game.abandon_path()
                     game.reset_path()
                     game.player.reset()
                     game.game_map.reset()
@@ -398,42 +428,23 @@ class GameDisplay:
                     treasures_copied = False
                     shortest_path_rect.clear()
                     pause.reset()
+                if is_paused and self.dirty is not None:
+                    # The pause menu was drawn over the game
+                    self.dirty.invalidate()
                 is_paused = False
 
+                # Path overlays are drawn once and then blitted, each adding only its new moves
                 if draw_all_path:
                     # Draws all paths for the current map from previous games
-                    for i in range(len(map_paths)):
-                        if i < len(paths_colors) - 1:
-                            path_vertices = map_paths[i].get_graph().get_vertices().values()
-                            for vertex in path_vertices:
-                                pos = vertex.pos
-                                neighbours = vertex.neighbours
-                                for neighbour in neighbours:
-                                    init_pos = (pos[0] + rect_size[0] / 2, pos[1] + rect_size[1] / 2)
-                                    end_pos = (neighbour.pos[0] + rect_size[0] / 2, neighbour.pos[1] + rect_size[1] / 2)
-                                    pg.draw.line(self.screen, paths_colors[i], init_pos, end_pos)
+                    self.screen.blit(all_path_overlay.get_surface(map_paths, paths_colors[:len(map_paths)]), (0, 0))
 
                 if draw_general_path:
                     # Draws all possible paths for the current game
-                    path_vertices = general_path.get_graph().get_vertices().values()
-                    for vertex in path_vertices:
-                        pos = vertex.pos
-                        neighbours = vertex.neighbours
-                        for neighbour in neighbours:
-                            init_pos = (pos[0] + rect_size[0] / 2, pos[1] + rect_size[1] / 2)
-                            end_pos = (neighbour.pos[0] + rect_size[0] / 2, neighbour.pos[1] + rect_size[1] / 2)
-                            pg.draw.line(self.screen, paths_colors[0], init_pos, end_pos)
+                    self.screen.blit(general_path_overlay.get_surface([general_path], paths_colors[:1]), (0, 0))
 
                 # Showing the path of the player
                 if draw_path:
-                    path_vertices = game.path.get_graph().get_vertices().values()
-                    for vertex in path_vertices:
-                        pos = vertex.pos
-                        neighbours = vertex.neighbours
-                        for neighbour in neighbours:
-                            init_pos = (pos[0] + rect_size[0] / 2, pos[1] + rect_size[1] / 2)
-                            end_pos = (neighbour.pos[0] + rect_size[0] / 2, neighbour.pos[1] + rect_size[1] / 2)
-                            pg.draw.line(self.screen, line_color, init_pos, end_pos)
+                    self.screen.blit(player_path_overlay.get_surface([game.path], [line_color]), (0, 0))
 
                 # On winning game
                 if game.player.backpack['treasures'] == game.game_map.get_difficulty():
@@ -441,12 +452,9 @@ class GameDisplay:
                     move_count = copy.deepcopy(game.path.move_count)
                     # Reset player position
                     player_rect.topleft = game.path.initial_pos
-                    # Saves current game score to player data and resets player
-                    game.player.update_data(game.game_map.get_difficulty())
+                    # Saves the current path, game score and leaderboard records, and resets player
+                    game.record_win()
                     game.player.reset()
-
-                    # Saves the current path to file
-                    game.path.write_path()
                     # The reset path function is part of the Game class, contrary to GameMap and Player
                     # This is path requires a given map and player, which are obtained from game.
                     game.reset_path()
@@ -459,6 +467,7 @@ class GameDisplay:
                     self.game_end(move_count)
 
                     # Reread from files
+                    game.close()
                     game = Game()
                     game.read()
                     game.set_map(map_id)
@@ -467,20 +476,22 @@ class GameDisplay:
                     game_start = False
 
                 # Display current number of fragments and treasures the player has found
-                self.show_score(game)
+                new_score_rects = self.show_score(game)
 
-                pg.display.flip()
+                if self.dirty is not None:
+                    # Only the player moves, revealed areas, found objects and score have changed,
+                    # unless the map, the path or what is drawn has changed
+                    self.dirty.check_state((map_id, show_all, draw_grid, draw_path, draw_all_path,
+                                            draw_general_path, len(shortest_path_rect) > 0))
+                    self.dirty.add_moves(game.path)
+                    for rect in score_rects + new_score_rects:
+                        self.dirty.add(rect)
+                score_rects = new_score_rects
+
+                self.update_display()
 
             self.clock.tick(60)
 
+        # Writes the moves still buffered, so the unfinished game can be resumed
+        game.close()
         pg.quit()
-
-
-def next_pos(cur_pos: Tuple[int, int], move: str, h_step, v_step) -> Tuple[int, int]:
-    """Helper function for analyzing next position coordinate by a given step"""
-    possible_next_pos = {'left': (cur_pos[0] - h_step, cur_pos[1]),
-                         'right': (cur_pos[0] + h_step, cur_pos[1]),
-                         'up': (cur_pos[0], cur_pos[1] - v_step),
-                         'down': (cur_pos[0], cur_pos[1] + v_step)}
-
-    return possible_next_pos[move]
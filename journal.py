@@ -0,0 +1,282 @@
+"""
+This file contains the path journal, an append-only file holding one record per
+finished game.
+
+The journal starts with a header holding its generation, which changes on every
+compaction. Each record is a fixed header (magic, map id, payload length and CRC-32
+of the payload) followed by the path in the compact path format (see Path.to_bytes).
+Records are only ever appended, so a crash can at most leave a torn record at the end
+of the journal, which is cut off the next time the journal is opened. The journal file
+is only created by the first append.
+
+The journal is indexed by a csv file with one row per record, so the paths of a single
+map are found without reading the journal itself. The index is only trusted if it was
+written for the current generation of the journal.
+"""
+from typing import BinaryIO, Dict, List, NamedTuple, Optional
+import csv
+import os
+import struct
+import zlib
+from path import Path, PATH_DIR, PATH_HEADER
+
+JOURNAL_FILE = os.path.join(PATH_DIR, 'journal.tpj')
+JOURNAL_INDEX_FILE = os.path.join(PATH_DIR, 'journal_index.csv')
+JOURNAL_MAGIC = b'PJNL'
+JOURNAL_HEADER = struct.Struct('<4sI')
+RECORD_MAGIC = b'PJRN'
+RECORD_HEADER = struct.Struct('<4sIII')
+# Number of records appended since the last compaction after which the journal is
+# compacted again
+COMPACT_INTERVAL = 1000
+
+
+class JournalEntry(NamedTuple):
+    """Index entry of a record in the journal"""
+    offset: int
+    map_id: int
+    length: int
+    player_id: str
+
+
+class PathJournal:
+    """An append-only journal of finished games.
+
+    Attributes
+    ----------
+    journal_file : str
+        The file the records are appended to.
+    index_file : str
+        The csv file indexing the records of the journal.
+    """
+    journal_file: str
+    index_file: str
+    _entries: List[JournalEntry]
+    _map_entries: Dict[int, List[JournalEntry]]
+    _generation: int
+    _compacted_count: int
+    _index_current: bool
+
+    def __init__(self, journal_file: Optional[str] = JOURNAL_FILE,
+                 index_file: Optional[str] = JOURNAL_INDEX_FILE) -> None:
+        """Opens the journal. A journal that does not exist yet is empty, and is only
+        created by the first append.
+
+        The index is read from the index file. Records appended after the last indexed
+        record are indexed by reading their headers (see _scan), and the index file is
+        only rewritten if such records are found.
+        """
+        self.journal_file = journal_file
+        self.index_file = index_file
+        self._entries = []
+        self._map_entries = {}
+        self._generation = 0
+        self._compacted_count = 0
+        self._index_current = False
+
+        if not self._exists():
+            return
+        with open(self.journal_file, 'rb') as file:
+            magic, self._generation = JOURNAL_HEADER.unpack(file.read(JOURNAL_HEADER.size))
+        if magic != JOURNAL_MAGIC:
+            raise ValueError('{} is not a path journal'.format(self.journal_file))
+        journal_size = os.path.getsize(self.journal_file)
+
+        indexed_end = JOURNAL_HEADER.size
+        if os.path.exists(self.index_file):
+            with open(self.index_file, newline='') as file:
+                reader = csv.reader(file)
+                header = next(reader, None)
+                if header and header[:2] == ['generation', str(self._generation)]:
+                    self._index_current = True
+                    self._compacted_count = int(header[3])
+                    for row in reader:
+                        entry = JournalEntry(int(row[0]), int(row[1]), int(row[2]), row[3])
+                        # Index rows of records missing from the journal are ignored
+                        if entry.offset + RECORD_HEADER.size + entry.length > journal_size:
+                            break
+                        self._add_entry(entry)
+                        indexed_end = entry.offset + RECORD_HEADER.size + entry.length
+
+        if self._scan(indexed_end, journal_size):
+            self._write_index()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_entries(self, map_id: Optional[int] = None) -> List[JournalEntry]:
+        """Return the index entries of all records, or only of the records on the given map"""
+        if map_id is None:
+            return list(self._entries)
+        return list(self._map_entries.get(map_id, []))
+
+    def append(self, path: Path) -> JournalEntry:
+        """Appends the given path as a new record, and returns its index entry
+
+        The record is flushed to disk before it is added to the index. The journal is
+        created if it does not exist yet.
+        """
+        if not self._exists():
+            with open(self.journal_file, 'wb') as file:
+                file.write(JOURNAL_HEADER.pack(JOURNAL_MAGIC, self._generation))
+
+        payload = path.to_bytes()
+        header = RECORD_HEADER.pack(RECORD_MAGIC, path.get_map(), len(payload), zlib.crc32(payload))
+        with open(self.journal_file, 'ab') as file:
+            offset = file.tell()
+            file.write(header + payload)
+            file.flush()
+            os.fsync(file.fileno())
+
+        entry = JournalEntry(offset, path.get_map(), len(payload), _read_player_id(payload))
+        self._add_entry(entry)
+        # An index missing or left from another generation is rewritten instead of appended to
+        if self._index_current:
+            with open(self.index_file, 'a', newline='') as file:
+                csv.writer(file).writerow(entry)
+        else:
+            self._write_index()
+        return entry
+
+    def read(self, entry: JournalEntry) -> bytes:
+        """Return the path saved in the given record, in the compact path format
+
+        Raise a ValueError if the record does not match its checksum.
+        """
+        with open(self.journal_file, 'rb') as file:
+            file.seek(entry.offset)
+            data = file.read(RECORD_HEADER.size + entry.length)
+        payload = _check_record(data)
+        if payload is None:
+            raise ValueError('Corrupt journal record at offset {}'.format(entry.offset))
+        return payload
+
+    def needs_compaction(self) -> bool:
+        """Return whether enough records were appended since the last compaction"""
+        return len(self._entries) - self._compacted_count >= COMPACT_INTERVAL
+
+    def compact(self) -> int:
+        """Rewrites the journal without the records that do not match their checksum,
+        and returns the number of records dropped.
+
+        The new journal is written to a temporary file, and then replaces the old one.
+        It has a new generation, so the old index is never used with it, even if the
+        index could not be rewritten.
+        """
+        if not self._exists():
+            return 0
+        kept = []
+        temp_journal = self.journal_file + '.tmp'
+        with open(self.journal_file, 'rb') as source, open(temp_journal, 'wb') as target:
+            target.write(JOURNAL_HEADER.pack(JOURNAL_MAGIC, self._generation + 1))
+            for entry in self._entries:
+                source.seek(entry.offset)
+                data = source.read(RECORD_HEADER.size + entry.length)
+                if _check_record(data) is None:
+                    continue
+                kept.append(entry._replace(offset=target.tell()))
+                target.write(data)
+            target.flush()
+            os.fsync(target.fileno())
+
+        os.replace(temp_journal, self.journal_file)
+
+        dropped = len(self._entries) - len(kept)
+        self._entries = []
+        self._map_entries = {}
+        for entry in kept:
+            self._add_entry(entry)
+        self._generation += 1
+        self._compacted_count = len(kept)
+        self._write_index()
+        return dropped
+
+    def _add_entry(self, entry: JournalEntry) -> None:
+        """Adds the entry to the in-memory index"""
+        self._entries.append(entry)
+        self._map_entries.setdefault(entry.map_id, []).append(entry)
+
+    def _scan(self, start: int, journal_size: int) -> int:
+        """Indexes the records from start to the end of the journal by reading their
+        headers, and returns the number of records found.
+
+        A record with an unknown magic, or whose length runs past the end of the journal,
+        is corrupt. Scanning resumes at the next record after it that matches its
+        checksum. If there is none, the journal is cut off at the corrupt record, so new
+        records are appended right after the last good one. This also cuts off a torn
+        record left by an interrupted append.
+        """
+        found = 0
+        offset = start
+        end = journal_size
+        with open(self.journal_file, 'rb') as file:
+            while offset < journal_size:
+                file.seek(offset)
+                header = file.read(RECORD_HEADER.size)
+                if len(header) == RECORD_HEADER.size:
+                    magic, map_id, length, _ = RECORD_HEADER.unpack(header)
+                else:
+                    magic, map_id, length = None, 0, 0
+                if magic != RECORD_MAGIC or offset + RECORD_HEADER.size + length > journal_size:
+                    next_offset = _find_record(file, offset + 1, journal_size)
+                    if next_offset is None:
+                        end = offset
+                        break
+                    offset = next_offset
+                    continue
+                player_id = _read_player_id(file.read(min(length, PATH_HEADER.size + 1024)))
+                self._add_entry(JournalEntry(offset, map_id, length, player_id))
+                offset += RECORD_HEADER.size + length
+                found += 1
+        if end < journal_size:
+            os.truncate(self.journal_file, end)
+        return found
+
+    def _exists(self) -> bool:
+        """Return whether the journal file exists and holds at least its header"""
+        return os.path.exists(self.journal_file) and os.path.getsize(self.journal_file) >= JOURNAL_HEADER.size
+
+    def _write_index(self) -> None:
+        """Rewrites the whole index file from the in-memory index"""
+        temp_index = self.index_file + '.tmp'
+        with open(temp_index, 'w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(['generation', self._generation, 'compacted', self._compacted_count])
+            writer.writerows(self._entries)
+        os.replace(temp_index, self.index_file)
+        self._index_current = True
+
+
+def _check_record(data: bytes) -> Optional[bytes]:
+    """Return the payload of a record, or None if the record is torn or does not match
+    its checksum"""
+    if len(data) < RECORD_HEADER.size:
+        return None
+    magic, _, length, checksum = RECORD_HEADER.unpack_from(data)
+    payload = data[RECORD_HEADER.size:RECORD_HEADER.size + length]
+    if magic != RECORD_MAGIC or len(payload) != length or zlib.crc32(payload) != checksum:
+        return None
+    return payload
+
+
+def _find_record(file: BinaryIO, start: int, end: int) -> Optional[int]:
+    """Return the offset of the first record between start and end that matches its
+    checksum, or None if there is none"""
+    file.seek(start)
+    data = file.read(end - start)
+    pos = data.find(RECORD_MAGIC)
+    while pos != -1:
+        if len(data) - pos >= RECORD_HEADER.size:
+            length = RECORD_HEADER.unpack_from(data, pos)[2]
+            if _check_record(data[pos:pos + RECORD_HEADER.size + length]) is not None:
+                return start + pos
+        pos = data.find(RECORD_MAGIC, pos + 1)
+    return None
+
+
+def _read_player_id(payload: bytes) -> str:
+    """Return the player id from the start of a path in the compact path format"""
+    if len(payload) < PATH_HEADER.size:
+        return ''
+    name_length = PATH_HEADER.unpack_from(payload)[-1]
+    return payload[PATH_HEADER.size:PATH_HEADER.size + name_length].decode('utf-8', errors='replace')
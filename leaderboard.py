@@ -0,0 +1,137 @@
+"""
+This file contains the leaderboard, which ranks players by their finished games.
+
+The leaderboard is kept in the player statistics database (see PlayerStats). Each
+finished game adds a row to the game history and updates the aggregates of its player
+on its map in the same transaction, so rankings are read from small indexed tables
+instead of being recomputed from every saved path.
+"""
+from typing import List, Optional, Tuple
+from journal import PathJournal
+from path import Path
+from stats import STATS_CSV, STATS_DB, PlayerStats
+
+# Player rankings, by the column of player_stats they are ordered by
+PLAYER_RANKINGS = ('treasures', 'games_played')
+
+
+class Leaderboard(PlayerStats):
+    """Rankings and game history of all players, kept next to their statistics.
+
+    Attributes
+    ----------
+    db_file : str
+        The sqlite database the leaderboard is saved in.
+    """
+
+    def __init__(self, db_file: Optional[str] = STATS_DB, import_file: Optional[str] = STATS_CSV) -> None:
+        """Opens the leaderboard, creating its tables if they do not exist"""
+        PlayerStats.__init__(self, db_file, import_file)
+        with self._connection:
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS games ('
+                'game_id INTEGER PRIMARY KEY, '
+                'player_id TEXT NOT NULL, '
+                'map_id INTEGER NOT NULL, '
+                'move_count INTEGER NOT NULL)')
+            self._connection.execute('CREATE INDEX IF NOT EXISTS games_player ON games (player_id, game_id)')
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS map_records ('
+                'map_id INTEGER NOT NULL, '
+                'player_id TEXT NOT NULL, '
+                'best_moves INTEGER NOT NULL, '
+                'games_played INTEGER NOT NULL, '
+                'PRIMARY KEY (map_id, player_id))')
+            self._connection.execute('CREATE INDEX IF NOT EXISTS map_records_moves ON map_records (map_id, best_moves)')
+            self._connection.execute('CREATE INDEX IF NOT EXISTS map_records_best ON map_records (best_moves)')
+            for column in PLAYER_RANKINGS:
+                self._connection.execute(
+                    'CREATE INDEX IF NOT EXISTS player_stats_{0} ON player_stats ({0})'.format(column))
+
+    def add_game(self, player_id: str, map_id: int, move_count: int) -> None:
+        """Adds a finished game of the player on the given map to the history and rankings
+
+        The player statistics are updated separately (see PlayerStats.record_game).
+        """
+        with self._connection:
+            self._add_game(player_id, map_id, move_count)
+
+    def record_win(self, player_id: str, vision_field: int, treasures: int, map_id: int, move_count: int) -> None:
+        """Records a finished game of the player in the player statistics, and in the
+        history and rankings, in a single transaction
+
+        Either both the statistics and the rankings are updated, or neither is.
+        """
+        with self._connection:
+            self._record_game(player_id, vision_field, treasures)
+            self._add_game(player_id, map_id, move_count)
+
+    def get_player_ranking(self, order_by: Optional[str] = 'treasures',
+                           limit: Optional[int] = 10) -> List[Tuple[str, int]]:
+        """Return the top players as (player_id, value) pairs, ranked by their total
+        treasures or games played
+
+        Raise a ValueError if order_by is not one of PLAYER_RANKINGS.
+        """
+        if order_by not in PLAYER_RANKINGS:
+            raise ValueError('Unknown ranking {}'.format(order_by))
+        return self._connection.execute(
+            'SELECT player_id, {0} FROM player_stats ORDER BY {0} DESC, player_id LIMIT ?'.format(order_by),
+            (limit,)).fetchall()
+
+    def get_fewest_moves(self, map_id: Optional[int] = None,
+                         limit: Optional[int] = 10) -> List[Tuple[str, int, int]]:
+        """Return the top (player_id, map_id, move_count) records, ranked by the fewest
+        moves needed to finish a game, on the given map or on any map"""
+        if map_id is None:
+            return self._connection.execute(
+                'SELECT player_id, map_id, best_moves FROM map_records '
+                'ORDER BY best_moves, player_id LIMIT ?', (limit,)).fetchall()
+        return self._connection.execute(
+            'SELECT player_id, map_id, best_moves FROM map_records WHERE map_id = ? '
+            'ORDER BY best_moves, player_id LIMIT ?', (map_id, limit)).fetchall()
+
+    def get_map_ranking(self, map_id: int, limit: Optional[int] = 10) -> List[Tuple[str, int]]:
+        """Return the players with the most finished games on the given map, as
+        (player_id, games_played) pairs"""
+        return self._connection.execute(
+            'SELECT player_id, games_played FROM map_records WHERE map_id = ? '
+            'ORDER BY games_played DESC, player_id LIMIT ?', (map_id, limit)).fetchall()
+
+    def get_player_history(self, player_id: str, limit: Optional[int] = 10) -> List[Tuple[int, int]]:
+        """Return the last finished games of the player as (map_id, move_count) pairs,
+        the most recent first"""
+        return self._connection.execute(
+            'SELECT map_id, move_count FROM games WHERE player_id = ? ORDER BY game_id DESC LIMIT ?',
+            (player_id, limit)).fetchall()
+
+    def rebuild(self, journal: PathJournal) -> int:
+        """Rebuilds the game history and map records from the paths saved in the journal,
+        and returns the number of games recorded.
+
+        This is only needed for games finished before the leaderboard existed.
+        """
+        num = 0
+        with self._connection:
+            self._connection.execute('DELETE FROM games')
+            self._connection.execute('DELETE FROM map_records')
+            for entry in journal.get_entries():
+                try:
+                    data = journal.read(entry)
+                except ValueError:
+                    continue
+                path = Path((0, 0))
+                path.load_bytes(data)
+                self._add_game(path.get_player(), path.get_map(), path.move_count)
+                num += 1
+        return num
+
+    def _add_game(self, player_id: str, map_id: int, move_count: int) -> None:
+        """Adds a game to the history and to the map records, inside the caller's transaction"""
+        self._connection.execute('INSERT INTO games (player_id, map_id, move_count) VALUES (?, ?, ?)',
+                                 (player_id, map_id, move_count))
+        self._connection.execute(
+            'INSERT INTO map_records (map_id, player_id, best_moves, games_played) VALUES (?, ?, ?, 1) '
+            'ON CONFLICT (map_id, player_id) DO UPDATE SET '
+            'best_moves = MIN(best_moves, excluded.best_moves), games_played = games_played + 1',
+            (map_id, player_id, move_count))
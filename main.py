@@ -1,6 +1,10 @@
 """
 Main execution file for CSC111 Final Project
+
+Run with --dirty-rects to only update the changed regions of the screen each frame,
+which is much cheaper on low-power machines.
 """
+import sys
 from interface import GameDisplay
 from game import Game
 
@@ -12,5 +16,5 @@ if __name__ == "__main__":
     game.generate_maps(num=0, difficulty=2)
     game.read()
 
-    interface = GameDisplay(screen_size)
+    interface = GameDisplay(screen_size, dirty_rects='--dirty-rects' in sys.argv)
     interface.run_game(game)
@@ -3,12 +3,29 @@ This file contains the necessary classes and methods for a game map.
 Incorporating the generation and placement of game objects
 """
 from typing import Tuple, Any, Dict, List, Optional
+from collections import deque
+import re
 import pygame as pg
 import numpy as np
-import pandas as pd
+import hashlib
 import random
+import struct
 import os
 
+MAP_DIR = 'maps'
+MAP_FILE_PATTERN = re.compile(r'^map(\d+)\.(csv|tmap)$')
+
+# Binary map format (.tmap): a fixed little-endian header, followed by packed int16
+# arrays of obstacle rects with their type codes, fragment rects and treasure rects.
+MAP_MAGIC = b'TMAP'
+MAP_VERSION = 1
+MAP_HEADER = struct.Struct('<4s8H')
+OBSTACLE_TYPES = ('rock', 'river')
+# Layers of the cell-occupancy index (see GameMap.get_cell_index)
+OBSTACLE_LAYER, FRAGMENT_LAYER, TREASURE_LAYER = 0, 1, 2
+# Bits of the movement mask of a cell (see GameMap.get_movement_mask)
+MOVE_BITS = {'left': 1, 'right': 2, 'up': 4, 'down': 8}
+
 
 class GameMap:
     """This represents a game map with the indicated obstacles and "difficulty" of the game.
@@ -30,11 +47,23 @@ class GameMap:
     _fragment_info: List[Tuple[int, ...]]
     _treasure_info: List[Tuple[int, ...]]
     _object_type: Dict[str, Any]
-
-    def __init__(self, screen_size: Tuple[int, int], div: int, autogen: bool, difficulty: Optional[int] = 4):
+    _terrain_cost: Dict[str, float]
+    _seed: Optional[int]
+    _rng: random.Random
+    _cell_indices: Dict[Tuple[int, int], np.ndarray]
+    _movement_masks: Dict[Tuple[int, int], np.ndarray]
+
+    def __init__(self, screen_size: Tuple[int, int], div: int, autogen: bool, difficulty: Optional[int] = 4,
+                 seed: Optional[int] = None):
         """Initializes GameMap object with the given game difficulty, movement step size,
-        and window size"""
+        and window size
+
+        All random choices of the map generation are drawn from a generator seeded with
+        seed, so the same seed and settings always generate the same map.
+        """
 
+        self._seed = seed
+        self._rng = random.Random(seed)
         self._width = screen_size[0]
         self._height = screen_size[1]
         self._difficulty = difficulty
@@ -47,14 +76,23 @@ class GameMap:
             'fragment': ((0, 0, 0), 1),
             'treasure': ((0, 0, 0), 1/2)
         }
+        # Cost of moving into a cell covered by the obstacle type, for weighted pathfinding.
+        # Obstacle types not listed here cannot be crossed.
+        self._terrain_cost = {
+            'river': 5
+        }
+        self._obstacle_info = list()
+        self._fragment_info = list()
+        self._treasure_info = list()
         self._obstacles = list()
         self._treasures = list()
         self._fragments = list()
         self._treasures_copy = list()
         self._fragments_copy = list()
+        self._cell_indices = {}
+        self._movement_masks = {}
         if autogen:
-            self.generate_obstacles()
-            self.generate_treasures()
+            self.generate_solvable()
             self.set_object_copy()
         self.map_id = 1
 
@@ -69,13 +107,16 @@ class GameMap:
         from the map itself. Thus, we need reset map on each game_exit to ensure that
         the fragments and treasures actually gets back to their original state.
         """
-        self._treasures = self._treasures_copy
-        self._fragments = self._fragments_copy
+        self._treasures = self._treasures_copy.copy()
+        self._fragments = self._fragments_copy.copy()
+        self._cell_indices = {}
 
     def set_object_copy(self) -> None:
         """Sets a copy of the generated fragments and treasures"""
         self._treasures_copy = self._treasures.copy()
         self._fragments_copy = self._fragments.copy()
+        self._cell_indices = {}
+        self._movement_masks = {}
 
     def get_obstacles(self) -> List[Tuple[pg.Rect, str]]:
         """Return the generated obstacles of this map"""
@@ -93,6 +134,10 @@ class GameMap:
         """Returns the relevant information for each type of game object"""
         return self._object_type
 
+    def get_terrain_costs(self) -> Dict[str, float]:
+        """Returns the movement cost of each obstacle type that can be crossed"""
+        return self._terrain_cost
+
     def get_object_info(self) -> Tuple[Any, ...]:
         """Returns the rect object information for each type"""
         return self._obstacle_info, self._fragment_info, self._treasure_info
@@ -108,10 +153,31 @@ class GameMap:
         """Return the width and height of the screen"""
         return self._width, self._height
 
+    def get_seed(self) -> Optional[int]:
+        """Return the seed this map was generated with"""
+        return self._seed
+
+    def fingerprint(self) -> str:
+        """Returns a hash of the map layout.
+
+        Two maps have the same fingerprint exactly when they have the same settings and
+        the same obstacles, fragments and treasures.
+        """
+        layout = (self.get_screen_size(), self._div, self._difficulty) + tuple(self.get_object_info())
+        return hashlib.sha256(repr(layout).encode()).hexdigest()
+
     def set_id(self, map_id: int) -> None:
         """Sets the according map ID"""
         self.map_id = map_id
 
+    def copy_layout(self) -> 'GameMap':
+        """Return a new map with the same id and layout as this map, with all of its
+        fragments and treasures in place, even those already found in this map"""
+        new_map = GameMap(self.get_screen_size(), self._div, False, self._difficulty)
+        new_map.set_object_info(*self.get_object_info())
+        new_map.set_id(self.map_id)
+        return new_map
+
     def generate_objects_from_info(self) -> None:
         """This is for using the information read from a map file to generate relevant
         game objects. However it uses its own attributes(e.g. self._obstacle_info) as
@@ -140,6 +206,208 @@ class GameMap:
 
         self.set_object_copy()
 
+    def generate_solvable(self, max_attempts: Optional[int] = 100) -> None:
+        """Generates obstacles, fragments and treasures until every fragment and treasure
+        can be reached from the start position.
+
+        Unsolvable layouts are rejected and generated again. Raise a ValueError if no
+        solvable layout is found in max_attempts attempts, or at once if the map is too
+        small for its objects whatever the obstacles.
+        """
+        for name, candidates, num in self._object_candidates():
+            if len(candidates) < num:
+                raise ValueError('Only {} positions on the map for {} {}'.format(len(candidates), num, name))
+        for _ in range(max_attempts):
+            self.generate_obstacles()
+            try:
+                self.generate_treasures()
+            except ValueError:
+                continue
+            if self.is_solvable():
+                return
+        raise ValueError('No solvable map found in {} attempts'.format(max_attempts))
+
+    def get_start_pos(self, rect_size: Tuple[int, int] = (8, 8)) -> Tuple[int, int]:
+        """Return the position the player starts each game at"""
+        return (int(self._width / self._div - rect_size[0] / 2),
+                int(self._height / 2 - rect_size[1] / 2))
+
+    def get_covered_cells(self, rect: pg.Rect, rect_size: Tuple[int, int] = (8, 8)) -> Tuple[np.ndarray, ...]:
+        """Return the grid cells where a player rect of rect_size would collide with rect.
+
+        Cell (i, j) is the player position (i * h_step - rect_size[0] / 2, j * v_step - rect_size[1] / 2).
+        The cells are returned as two boolean masks over i and j, in 0 to div.
+        """
+        cells = np.arange(self._div + 1)
+        x = (cells * self._h_step - rect_size[0] / 2).astype(int)
+        y = (cells * self._v_step - rect_size[1] / 2).astype(int)
+        return (x < rect.right) & (x + rect_size[0] > rect.left), (y < rect.bottom) & (y + rect_size[1] > rect.top)
+
+    def get_cell(self, pos: Tuple[int, int], rect_size: Tuple[int, int] = (8, 8)) -> Tuple[int, int]:
+        """Return the grid cell (i, j) of the player position pos"""
+        return (round((pos[0] + rect_size[0] / 2) / self._h_step),
+                round((pos[1] + rect_size[1] / 2) / self._v_step))
+
+    def get_cell_index(self, rect_size: Tuple[int, int] = (8, 8)) -> np.ndarray:
+        """Return the cell-occupancy index of the map for player rects of rect_size.
+
+        The index is an int array of shape (3, div + 1, div + 1). For each cell (i, j),
+        layers OBSTACLE_LAYER, FRAGMENT_LAYER and TREASURE_LAYER hold the id of the
+        obstacle, fragment or treasure a player at the cell collides with, or -1.
+        Obstacle ids index get_obstacles(). Fragment and treasure ids index the objects
+        of the map before any were found, and found objects are removed from the index.
+
+        Where obstacles overlap, a cell holds the one that cannot be crossed, or else
+        the one with the highest terrain cost. The index is built once, and rebuilt
+        after the map objects are reset.
+        """
+        if rect_size not in self._cell_indices:
+            index = np.full((3, self._div + 1, self._div + 1), -1, dtype=np.int32)
+            by_cost = sorted(range(len(self._obstacles)),
+                             key=lambda k: self._terrain_cost.get(self._obstacles[k][1], float('inf')))
+            for obstacle_id in by_cost:
+                index[OBSTACLE_LAYER][np.ix_(*self.get_covered_cells(self._obstacles[obstacle_id][0], rect_size))] = \
+                    obstacle_id
+            for layer, objects, remaining in ((FRAGMENT_LAYER, self._fragments_copy, self._fragments),
+                                              (TREASURE_LAYER, self._treasures_copy, self._treasures)):
+                # Objects are written in reverse, so where objects overlap a cell holds the
+                # first one, as with pg.Rect.collidelist
+                for object_id in reversed(range(len(objects))):
+                    if objects[object_id] in remaining:
+                        index[layer][np.ix_(*self.get_covered_cells(objects[object_id], rect_size))] = object_id
+            self._cell_indices[rect_size] = index
+        return self._cell_indices[rect_size]
+
+    def obstacle_at(self, pos: Tuple[int, int],
+                    rect_size: Tuple[int, int] = (8, 8)) -> Optional[Tuple[pg.Rect, str]]:
+        """Return the obstacle a player at pos collides with, or None"""
+        obstacle_id = self._object_id_at(OBSTACLE_LAYER, pos, rect_size)
+        return None if obstacle_id == -1 else self._obstacles[obstacle_id]
+
+    def fragment_at(self, pos: Tuple[int, int], rect_size: Tuple[int, int] = (8, 8)) -> Optional[pg.Rect]:
+        """Return the fragment, not found yet, that a player at pos collides with, or None"""
+        fragment_id = self._object_id_at(FRAGMENT_LAYER, pos, rect_size)
+        return None if fragment_id == -1 else self._fragments_copy[fragment_id]
+
+    def treasure_at(self, pos: Tuple[int, int], rect_size: Tuple[int, int] = (8, 8)) -> Optional[pg.Rect]:
+        """Return the treasure, not found yet, that a player at pos collides with, or None"""
+        treasure_id = self._object_id_at(TREASURE_LAYER, pos, rect_size)
+        return None if treasure_id == -1 else self._treasures_copy[treasure_id]
+
+    def is_walkable(self, pos: Tuple[int, int], rect_size: Tuple[int, int] = (8, 8)) -> bool:
+        """Return whether a player can stand at pos, away from the edges of the screen
+        and obstacles"""
+        i, j = self.get_cell(pos, rect_size)
+        return 0 < i < self._div and 0 < j < self._div and \
+            self.get_cell_index(rect_size).item(OBSTACLE_LAYER, i, j) == -1
+
+    def get_movement_mask(self, rect_size: Tuple[int, int] = (8, 8)) -> np.ndarray:
+        """Return the movements allowed from each cell, as a uint8 array indexed by [i, j].
+
+        The mask of a cell has the bit in MOVE_BITS of each direction whose neighbouring
+        cell is walkable (see get_walkable_cells). It only depends on the obstacles, so
+        it is computed once per map.
+        """
+        if rect_size not in self._movement_masks:
+            walkable = self.get_walkable_cells(rect_size)
+            mask = np.zeros(walkable.shape, dtype=np.uint8)
+            mask[1:, :] |= np.where(walkable[:-1, :], MOVE_BITS['left'], 0).astype(np.uint8)
+            mask[:-1, :] |= np.where(walkable[1:, :], MOVE_BITS['right'], 0).astype(np.uint8)
+            mask[:, 1:] |= np.where(walkable[:, :-1], MOVE_BITS['up'], 0).astype(np.uint8)
+            mask[:, :-1] |= np.where(walkable[:, 1:], MOVE_BITS['down'], 0).astype(np.uint8)
+            self._movement_masks[rect_size] = mask
+        return self._movement_masks[rect_size]
+
+    def can_move(self, pos: Tuple[int, int], move: str, rect_size: Tuple[int, int] = (8, 8)) -> bool:
+        """Return whether a player at pos can move one step in the direction move
+        ('left', 'right', 'up' or 'down')"""
+        i, j = self.get_cell(pos, rect_size)
+        if not (0 <= i <= self._div and 0 <= j <= self._div):
+            return False
+        return bool(self.get_movement_mask(rect_size).item(i, j) & MOVE_BITS[move])
+
+    def remove_fragment(self, fragment: pg.Rect) -> None:
+        """Removes a found fragment from the map, until the map is reset"""
+        self._fragments.remove(fragment)
+        self._remove_from_index(FRAGMENT_LAYER, self._fragments_copy.index(fragment))
+
+    def remove_treasure(self, treasure: pg.Rect) -> None:
+        """Removes an opened treasure from the map, until the map is reset"""
+        self._treasures.remove(treasure)
+        self._remove_from_index(TREASURE_LAYER, self._treasures_copy.index(treasure))
+
+    def _object_id_at(self, layer: int, pos: Tuple[int, int], rect_size: Tuple[int, int]) -> int:
+        """Return the id of the object in the layer of the cell index at pos, or -1"""
+        i, j = self.get_cell(pos, rect_size)
+        if not (0 <= i <= self._div and 0 <= j <= self._div):
+            return -1
+        return self.get_cell_index(rect_size).item(layer, i, j)
+
+    def _remove_from_index(self, layer: int, object_id: int) -> None:
+        """Clears the cells of an object from the layer of every built cell index"""
+        for index in self._cell_indices.values():
+            index[layer][index[layer] == object_id] = -1
+
+    def get_walkable_cells(self, rect_size: Tuple[int, int] = (8, 8)) -> np.ndarray:
+        """Return a boolean grid, indexed by [i, j], of the cells a player can stand on.
+
+        Cells on the edges of the screen and cells colliding with an obstacle are not
+        walkable.
+        """
+        walkable = np.zeros((self._div + 1, self._div + 1), dtype=bool)
+        walkable[1:self._div, 1:self._div] = True
+        for rect, _ in self._obstacles:
+            walkable[np.ix_(*self.get_covered_cells(rect, rect_size))] = False
+        return walkable
+
+    def get_unreachable_objects(self, rect_size: Tuple[int, int] = (8, 8)) -> List[pg.Rect]:
+        """Return the fragments and treasures that cannot be reached from the start position.
+
+        This uses a single flood fill over the walkable cells. Treasures block the player
+        until they are opened, so the flood fill does not go through them, but a treasure
+        only needs one of its cells next to the filled area.
+        """
+        walkable = self.get_walkable_cells(rect_size)
+        passable = walkable.copy()
+        for rect in self._treasures:
+            passable[np.ix_(*self.get_covered_cells(rect, rect_size))] = False
+
+        h_step, v_step = self.get_step()
+        start_pos = self.get_start_pos(rect_size)
+        start = (int((start_pos[0] + rect_size[0] / 2) / h_step), int((start_pos[1] + rect_size[1] / 2) / v_step))
+        reached = np.zeros_like(walkable)
+        queue = deque()
+        if passable[start]:
+            reached[start] = True
+            queue.append(start)
+        while queue:
+            i, j = queue.popleft()
+            for cell in ((i - 1, j), (i + 1, j), (i, j - 1), (i, j + 1)):
+                if passable[cell] and not reached[cell]:
+                    reached[cell] = True
+                    queue.append(cell)
+
+        # A treasure can be entered from any reached neighbouring cell
+        enterable = reached.copy()
+        enterable[1:, :] |= reached[:-1, :]
+        enterable[:-1, :] |= reached[1:, :]
+        enterable[:, 1:] |= reached[:, :-1]
+        enterable[:, :-1] |= reached[:, 1:]
+        enterable &= walkable
+
+        unreachable = []
+        for rect in self._fragments:
+            if not reached[np.ix_(*self.get_covered_cells(rect, rect_size))].any():
+                unreachable.append(rect)
+        for rect in self._treasures:
+            if not enterable[np.ix_(*self.get_covered_cells(rect, rect_size))].any():
+                unreachable.append(rect)
+        return unreachable
+
+    def is_solvable(self, rect_size: Tuple[int, int] = (8, 8)) -> bool:
+        """Return whether every fragment and treasure can be reached from the start position"""
+        return not self.get_unreachable_objects(rect_size)
+
     def generate_obstacles(self) -> None:
         """Generates the obstacles on the map with the required obstacle types.
 
@@ -152,45 +420,40 @@ class GameMap:
         obstacles = []
         obstacles_list = []
         obstacle_col = []
-        obstacle_heights = []
         obstacle_col_info = []
         obstacle_info = []
+        # Boolean mask over the y-pixels of the current column, where True means the
+        # pixel is still open for the player to go through.
+        y_free = np.ones(self._height, dtype=bool)
 
         while col_count < col_num:
 
-            obstacle = random.choice(['rock', 'river'])
+            obstacle = self._rng.choice(['rock', 'river'])
 
             rect_gen, rect_info = self._generate_helper(col_count, obstacle)
 
-            obstacle_heights.append((rect_info[1], rect_info[3]))
-
-            # Generates a new list from 0 to height (0, 1, 2, 3,...,height).
-            y = np.arange(0, self._height)
-            # For each rectangle generated, its height range is removed from the list.
-            # e.g. Rectangle that occupies from y = 200 to y = 400 will remove that range,
-            # which then becomes (0, 1, 2,...,198,199, 401, 402,...,height)
-            for x in obstacle_heights:
-                y = remove_range(x[0], x[0] + x[1], y)
+            # Each rectangle generated closes its height range in the column.
+            # e.g. Rectangle that occupies from y = 200 to y = 400 closes that range,
+            # which leaves (0, 1, 2,...,198,199, 401, 402,...,height) open
+            y_free[rect_info[1]:rect_info[1] + rect_info[3] + 1] = False
 
             # Checks whether total number of obstacles is reached either by game difficulty settings
             # or if there is no space left for the player to go through if the rectangle is added.
-            if len(obstacle_col) >= (self._difficulty * 2) or len(y) <= ((6 - self._difficulty) * self._v_step):
+            if len(obstacle_col) >= (self._difficulty * 2) or \
+                    np.count_nonzero(y_free) <= ((6 - self._difficulty) * self._v_step):
                 # Adds the column of obstacles to the list of all obstacles
                 obstacle_info.extend(obstacle_col_info)
                 obstacles.extend(obstacle_col)
                 col_count += 1
                 # Resets the column
-                print("col num:" + str(col_count))
-                print(y)
                 obstacle_col.clear()
                 obstacle_col_info.clear()
-                obstacle_heights.clear()
+                y_free[:] = True
             else:
                 # If above conditions are not met, add a new obstacle to the column
                 if rect_gen.collidelist(obstacles_list) == -1:
                     obstacle_col_info.append((rect_info, obstacle))
                     obstacle_col.append((rect_gen, obstacle))
-                    print(len(obstacle_col))
                     obstacles_list.append(rect_gen)
 
         self._obstacle_info = obstacle_info
@@ -201,88 +464,140 @@ class GameMap:
 
         Note that contrary to obstacle generation, where each rect is generated
         in columns, this is random, and takes range for almost the entire map.
+
+        The free positions are found first from an occupancy grid of the map, and the
+        objects are then placed on a random sample of them, so no position is tried
+        twice. Raise a ValueError if the objects do not fit on the map.
         """
+        # Pixel occupancy grid of the map, indexed by [x, y]
+        occupied = np.zeros((self._width, self._height), dtype=bool)
+        for rect, _ in self._obstacles:
+            occupied[rect.left:rect.right, rect.top:rect.bottom] = True
+
+        placed = {}
+        for name, candidates, num in self._object_candidates():
+            placed[name] = self._place_objects(candidates, num, occupied, name)
+        fragment_info, treasure_info = placed['fragments'], placed['treasures']
+
+        self._fragments = [pg.Rect(rect) for rect in fragment_info]
+        self._treasures = [pg.Rect(rect) for rect in treasure_info]
+        self._fragment_info, self._treasure_info = fragment_info, treasure_info
+
+    def _object_candidates(self) -> List[Tuple[str, List[Tuple[int, ...]], int]]:
+        """Returns the name, the candidate rects and the number to place of the fragments
+        and of the treasures"""
         num_fragments = self._difficulty * 3
         num_treasures = self._difficulty
         col_width = (6 - self._difficulty) * self._h_step * 2
-        list_obstacles = [o[0] for o in self._obstacles]
-        list_fragments = []
-        list_treasures = []
-        fragments = []
-        treasures = []
-        fragment_info = []
-        treasure_info = []
-        frag_count = 0
-        treasure_count = 0
-
-        while frag_count < num_fragments:
-            # Generating Key fragments
-            # All object generations start at a certain point a few steps from the left
-
-            # All this does is putting the fragments in the middle of the grid lines
-            x = int((col_width + 2 * self._h_step + self._h_step / 2) +
-                    random.randint(1, int(self._div - (col_width + 2 * self._h_step) / self._h_step - 2))
-                    * self._h_step)
-            y = int(self._v_step / 2 + random.randint(1, self._div - 2) * self._v_step)
-
-            rect_x = int(self._h_step)
-            rect_y = int(rect_x * self._object_type['fragment'][1])
-
-            # Generate Rectangle object from given coordinates and size
-            fragment_rect = pg.Rect(x, y, rect_x, rect_y)
-
-            # Check collision with existing game objects
-            if fragment_rect.collidelist(list_obstacles) == -1:
-                if fragment_rect.collidelist(list_fragments) == -1:
-                    list_fragments.append(fragment_rect)
-                    fragment_info.append((x, y, rect_x, rect_y))
-                    fragments.append(fragment_rect)
-                    frag_count += 1
-
-        while treasure_count < num_treasures:
-            x = int((col_width + 2 * self._h_step) +
-                    (random.randint(1, int(self._div - (col_width + 2 * self._h_step) / self._h_step - 4)) + 0.5)
-                    * self._h_step)
-            y = int((random.randint(2, self._div - 2) + 0.5) * self._v_step)
-
-            rect_x = int(self._h_step * 2)
-            rect_y = int(rect_x * self._object_type['treasure'][1])
-
-            # Generate Rectangle object from given coordinates and size
-            treasure_rect = pg.Rect(x, y, rect_x, rect_y)
-
-            # Check collision with existing game objects
-            if treasure_rect.collidelist(list_obstacles) == -1:
-                if treasure_rect.collidelist(list_fragments) == -1:
-                    if treasure_rect.collidelist(list_treasures) == -1:
-                        list_treasures.append(treasure_rect)
-                        treasure_info.append((x, y, rect_x, rect_y))
-                        treasures.append(treasure_rect)
-                        treasure_count += 1
-
-        self._fragments, self._treasures = fragments, treasures
-        self._fragment_info, self._treasure_info = fragment_info, treasure_info
+
+        # Generating Key fragments
+        # All object generations start at a certain point a few steps from the left
+        # All this does is putting the fragments in the middle of the grid lines
+        rect_x = int(self._h_step)
+        rect_y = int(rect_x * self._object_type['fragment'][1])
+        fragment_candidates = []
+        for i in range(1, int(self._div - (col_width + 2 * self._h_step) / self._h_step - 2) + 1):
+            for j in range(1, self._div - 1):
+                x = int((col_width + 2 * self._h_step + self._h_step / 2) + i * self._h_step)
+                y = int(self._v_step / 2 + j * self._v_step)
+                fragment_candidates.append((x, y, rect_x, rect_y))
+
+        rect_x = int(self._h_step * 2)
+        rect_y = int(rect_x * self._object_type['treasure'][1])
+        treasure_candidates = []
+        for i in range(1, int(self._div - (col_width + 2 * self._h_step) / self._h_step - 4) + 1):
+            for j in range(2, self._div - 1):
+                x = int((col_width + 2 * self._h_step) + (i + 0.5) * self._h_step)
+                y = int((j + 0.5) * self._v_step)
+                treasure_candidates.append((x, y, rect_x, rect_y))
+
+        return [('fragments', fragment_candidates, num_fragments),
+                ('treasures', treasure_candidates, num_treasures)]
+
+    def _place_objects(self, candidates: List[Tuple[int, ...]], num: int, occupied: np.ndarray,
+                       name: str) -> List[Tuple[int, ...]]:
+        """Places num objects on a random sample of the candidate rects that are free in
+        the occupancy grid, and marks them as occupied.
+
+        Raise a ValueError if fewer than num candidates can be placed.
+        """
+        free = [rect for rect in candidates
+                if not occupied[rect[0]:rect[0] + rect[2], rect[1]:rect[1] + rect[3]].any()]
+        if len(free) < num:
+            raise ValueError('Only {} free positions for {} {}'.format(len(free), num, name))
+
+        placed = []
+        # Free positions are visited in a random order, each at most once. A position is
+        # skipped if an object placed before it overlaps it.
+        for x, y, w, h in self._rng.sample(free, len(free)):
+            if len(placed) == num:
+                break
+            if not occupied[x:x + w, y:y + h].any():
+                occupied[x:x + w, y:y + h] = True
+                placed.append((x, y, w, h))
+
+        if len(placed) < num:
+            raise ValueError('Only {} of {} {} fit on the map'.format(len(placed), num, name))
+        return placed
 
     def _generate_helper(self, col_count: int, obstacle: str) -> Tuple[pg.Rect, Tuple[int, ...]]:
         """Generates a single obstacle object in the given column. This is for obstacles only"""
         col_width = (6 - self._difficulty) * self._h_step * 2
 
         x = col_count * col_width + 2 * self._h_step
-        y = random.randrange(0, int(0.9 * self._height), self._v_step)
+        y = self._rng.randrange(0, int(0.9 * self._height), self._v_step)
 
         rect_x = col_width - self._h_step * 2
-        rect_y = random.randint(1, self._object_type[obstacle][1]) * rect_x
+        rect_y = self._rng.randint(1, self._object_type[obstacle][1]) * rect_x
 
         # Generate Rectangle object from given coordinates and size
         obstacle_rect = pg.Rect(x, y, rect_x, rect_y)
 
         return obstacle_rect, (x, y, rect_x, rect_y)
 
-    def write_map(self) -> None:
-        """Save the current map information to a new file under directory 'maps', with name map[num].csv"""
-        # Returns number of existing maps from directory
-        map_num = len([m for m in os.listdir('maps/')])
-        self.map_id = map_num + 1
+    def set_object_info(self, obstacle_info: List[Tuple[Tuple[int, ...], str]],
+                        fragment_info: List[Tuple[int, ...]],
+                        treasure_info: List[Tuple[int, ...]]) -> None:
+        """Sets the rect object information for each type, and generates the relevant
+        game objects from it"""
+        self._obstacle_info = obstacle_info
+        self._fragment_info = fragment_info
+        self._treasure_info = treasure_info
+        self.generate_objects_from_info()
+
+    def write_map(self, map_id: Optional[int] = None, binary: Optional[bool] = False) -> None:
+        """Save the current map information to a file under directory 'maps', with name map[num].csv,
+        or map[num].tmap if binary is True
+
+        If no map_id is given, a new id is reserved (see reserve_map_ids). The map is
+        written to a temporary file, which then replaces the map file, so a failed write
+        never leaves a partial map behind. The reserved (empty) map file is removed if
+        the write fails.
+        """
+        if map_id is None:
+            map_id = reserve_map_ids(1, binary)[0]
+        self.map_id = map_id
+        map_file = os.path.join(MAP_DIR, 'map{}.{}'.format(self.map_id, 'tmap' if binary else 'csv'))
+
+        temp_file = '{}.{}.tmp'.format(map_file, os.getpid())
+        written = False
+        try:
+            if binary:
+                with open(temp_file, 'wb') as file:
+                    file.write(self.to_bytes())
+            else:
+                self._write_csv(temp_file)
+            os.replace(temp_file, map_file)
+            written = True
+        finally:
+            if not written:
+                if os.path.exists(temp_file):
+                    os.remove(temp_file)
+                release_map_ids([self.map_id])
+
+    def _write_csv(self, file_name: str) -> None:
+        """Save the current map information to file_name in the csv format"""
+        pd = import_pandas()
         # Retrieves specific object information, save to dataframe
         obstacle_info = pd.DataFrame({'obstacle': [x[0] for x in self.get_object_info()[0]]})
         obstacle_type = pd.DataFrame({'obstacle_type': [x[1] for x in self.get_object_info()[0]]})
@@ -298,15 +613,24 @@ class GameMap:
         object_info = pd.concat([obstacle_info, obstacle_type, treasure_info, fragment_info, settings_info],
                                 axis=1, ignore_index=False)
 
-        # Sets new map name. This is given by 'maps' + the map index.
-        map_name = 'map{}.csv'.format(self.map_id)
         # Saves map file to directory
-        object_info.to_csv(os.path.join(r'maps\\', map_name), index=False)
+        object_info.to_csv(file_name, index=False)
 
     def read_map(self, map_name: str):
         """Reads a game map from file, retrieving all relevant information required
-        to generate a map"""
-        map_dir = os.path.join(r'maps\\', (map_name + '.csv'))
+        to generate a map
+
+        The binary file map_name.tmap is read if it exists, and map_name.csv otherwise.
+        """
+        binary_dir = os.path.join(MAP_DIR, (map_name + '.tmap'))
+        if is_map_file(binary_dir):
+            with open(binary_dir, 'rb') as file:
+                self.load_bytes(file.read())
+            self.map_id = int(map_name[len('map'):])
+            return
+
+        pd = import_pandas()
+        map_dir = os.path.join(MAP_DIR, (map_name + '.csv'))
         # Reading game_map type file
         df = pd.read_csv(map_dir, index_col=False)
 
@@ -320,10 +644,10 @@ class GameMap:
         difficulty = int(df['difficulty'][0])
 
         # Each value of the DataFrame is of type string, except for the difficulty.
-        # Thus, by evaluating each returns the tuple objects.
-        obstacle_info = [eval(rect) for rect in obstacles]
-        treasure_info = [eval(rect) for rect in treasures]
-        fragment_info = [eval(rect) for rect in fragments]
+        # Thus, by parsing each returns the tuple objects.
+        obstacle_info = [parse_rect(rect) for rect in obstacles]
+        treasure_info = [parse_rect(rect) for rect in treasures]
+        fragment_info = [parse_rect(rect) for rect in fragments]
 
         # Concatenate the obstacle rect to their relevant type
         assert len(obstacle_info) == len(obstacle_type)
@@ -332,43 +656,168 @@ class GameMap:
             obstacle_concat.append((obstacle_info[i], obstacle_type[i]))
 
         # Save the game objects and settings to the current game map
-        obstacle_info_concat = obstacle_concat
-        self._obstacle_info = obstacle_info_concat
-        self._treasure_info = treasure_info
-        self._fragment_info = fragment_info
         self._difficulty = difficulty
-        self.generate_objects_from_info()
-        self.map_id = int(map_name[-1])
+        self.set_object_info(obstacle_concat, fragment_info, treasure_info)
+        self.map_id = int(map_name[len('map'):])
+
+    def to_bytes(self) -> bytes:
+        """Returns the map information in the binary map format"""
+        obstacle_info, fragment_info, treasure_info = self.get_object_info()
+        header = MAP_HEADER.pack(MAP_MAGIC, MAP_VERSION, self._width, self._height, self._div,
+                                 self._difficulty, len(obstacle_info), len(fragment_info), len(treasure_info))
+        obstacles = np.array([tuple(rect) + (OBSTACLE_TYPES.index(types),) for rect, types in obstacle_info],
+                             dtype='<i2').reshape(-1, 5)
+        fragments = np.array(fragment_info, dtype='<i2').reshape(-1, 4)
+        treasures = np.array(treasure_info, dtype='<i2').reshape(-1, 4)
+        return header + obstacles.tobytes() + fragments.tobytes() + treasures.tobytes()
+
+    def load_bytes(self, data: bytes) -> None:
+        """Loads the map information from data in the binary map format
+
+        Raise a ValueError if data is not a map in the binary format, or if it was saved
+        with a different screen size or grid division.
+        """
+        if len(data) < MAP_HEADER.size:
+            raise ValueError('Map data is too short')
+        magic, version, width, height, div, difficulty, num_obstacles, num_fragments, num_treasures = \
+            MAP_HEADER.unpack_from(data)
+        if magic != MAP_MAGIC or version != MAP_VERSION:
+            raise ValueError('Not a version {} binary map'.format(MAP_VERSION))
+        if (width, height, div) != (self._width, self._height, self._div):
+            raise ValueError('Map was saved for a {}x{} screen with div {}'.format(width, height, div))
+
+        count = num_obstacles * 5 + (num_fragments + num_treasures) * 4
+        if len(data) < MAP_HEADER.size + count * 2:
+            raise ValueError('Map data is too short')
+        rects = np.frombuffer(data, dtype='<i2', offset=MAP_HEADER.size, count=count)
+        fragment_start = num_obstacles * 5
+        treasure_start = fragment_start + num_fragments * 4
+        obstacles = rects[:fragment_start].reshape(-1, 5).tolist()
+        fragments = rects[fragment_start:treasure_start].reshape(-1, 4).tolist()
+        treasures = rects[treasure_start:].reshape(-1, 4).tolist()
+
+        self._difficulty = difficulty
+        self.set_object_info([(tuple(o[:4]), OBSTACLE_TYPES[o[4]]) for o in obstacles],
+                             [tuple(f) for f in fragments], [tuple(t) for t in treasures])
 
 
 # Helper functions
-def remove_range(start: int, stop: int, lst: np.array) -> np.array:
-    """Removes elements from the list that satisfy start <= element <= stop"""
-    i = 0
-    while i < len(lst):
-        if start <= lst[i] <= stop:
-            lst = np.delete(lst, i)
-            i -= 1
-        i += 1
+def list_map_ids() -> List[int]:
+    """Return the ids of all maps saved under directory 'maps', in increasing order
+
+    A map saved in both the csv and the binary format is only listed once. Empty map
+    files, which hold ids reserved by reserve_map_ids, are skipped.
+    """
+    return sorted(get_map_mtimes())
 
-    return lst
 
+def get_map_mtimes() -> Dict[int, float]:
+    """Return the last modification time of each map saved under directory 'maps', by
+    map id
 
-def len_largest_interval(lst: np.array) -> int:
-    """Return the continuous interval(increment of 1) of greatest length from a
-    given list"""
-    counter = 1
-    max_len = 0
+    The time of a map saved in both formats is that of its newest file. Empty map
+    files, which hold ids reserved by reserve_map_ids, are skipped.
+    """
+    map_mtimes = {}
+    with os.scandir(MAP_DIR) as entries:
+        for entry in entries:
+            match = MAP_FILE_PATTERN.match(entry.name)
+            if match:
+                stat = entry.stat()
+                if stat.st_size > 0:
+                    map_id = int(match.group(1))
+                    map_mtimes[map_id] = max(stat.st_mtime, map_mtimes.get(map_id, 0))
+    return map_mtimes
+
+
+def is_map_file(map_file: str) -> bool:
+    """Return whether map_file exists and holds a map, rather than a reserved id"""
+    return os.path.exists(map_file) and os.path.getsize(map_file) > 0
+
+
+def reserve_map_ids(num: int, binary: Optional[bool] = False) -> List[int]:
+    """Reserves num new map ids, following the largest id saved under directory 'maps',
+    either in its own file or in the map catalogue.
+
+    Each id is claimed by exclusively creating its (empty) map file, in the binary format
+    if binary is True, so concurrent writers never receive the same id. The reserved
+    files are meant to be filled with GameMap.write_map.
+    """
+    # catalogue imports this module, so it can only be imported once both are loaded
+    from catalogue import read_catalogue_ids
+    map_ids = []
+    map_id = max(list_map_ids() + read_catalogue_ids(), default=0)
+    extension = 'tmap' if binary else 'csv'
+    while len(map_ids) < num:
+        map_id += 1
+        try:
+            fd = os.open(os.path.join(MAP_DIR, 'map{}.{}'.format(map_id, extension)),
+                         os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            continue
+        os.close(fd)
+        map_ids.append(map_id)
+    return map_ids
+
+
+def release_map_ids(map_ids: List[int]) -> None:
+    """Removes the reserved map files of map_ids that were never written"""
+    for map_id in map_ids:
+        for extension in ('csv', 'tmap'):
+            map_file = os.path.join(MAP_DIR, 'map{}.{}'.format(map_id, extension))
+            if os.path.exists(map_file) and not is_map_file(map_file):
+                os.remove(map_file)
+
+
+def import_pandas() -> Any:
+    """Return the pandas module
+
+    pandas is only imported when a csv file is read or written, as it is slow to import.
+    """
+    import pandas
+    return pandas
 
-    for i in range(len(lst) - 1):
-        if lst[i+1] - lst[i] == 1:
-            counter += 1
-        else:
-            if counter > max_len:
-                max_len = counter
-            counter = 1
 
-    return max_len
+def parse_rect(text: str) -> Tuple[int, ...]:
+    """Parses a rect saved as text, e.g. '(120, 320, 40, 80)', into a tuple of integers"""
+    return tuple(int(value) for value in text.strip('()').split(','))
 
 
+def convert_maps(remove_csv: Optional[bool] = False,
+                 screen_size: Tuple[int, int] = (800, 800), div: int = 40) -> List[int]:
+    """Converts every csv map under directory 'maps' without a binary copy to the binary
+    format, and returns the converted map ids.
+
+    The csv files are removed after conversion if remove_csv is True.
+    """
+    converted = []
+    for map_id in list_map_ids():
+        csv_dir = os.path.join(MAP_DIR, 'map{}.csv'.format(map_id))
+        if is_map_file(os.path.join(MAP_DIR, 'map{}.tmap'.format(map_id))):
+            continue
+        game_map = GameMap(screen_size, div, False)
+        game_map.read_map('map{}'.format(map_id))
+        game_map.write_map(map_id, binary=True)
+        if remove_csv:
+            os.remove(csv_dir)
+        converted.append(map_id)
+    return converted
 
+
+def remove_range(start: int, stop: int, lst: np.array) -> np.array:
+    """Removes elements from the list that satisfy start <= element <= stop"""
+    lst = np.asarray(lst)
+    return lst[(lst < start) | (lst > stop)]
+
+
+def len_largest_interval(lst: np.array) -> int:
+    """Return the continuous interval(increment of 1) of greatest length from a
+    given list"""
+    lst = np.asarray(lst)
+    if len(lst) == 0:
+        return 0
+    # Indices where an interval ends, found from the gaps between consecutive elements
+    breaks = np.flatnonzero(np.diff(lst) != 1)
+    ends = np.concatenate((breaks, [len(lst) - 1]))
+    starts = np.concatenate(([0], breaks + 1))
+    return int(np.max(ends - starts + 1))
@@ -1,13 +1,18 @@
-import os
 import pygame as pg
 from pygame.locals import *
 import pygame_gui as pg_gui
 from typing import Tuple, List, Dict
+import html
 from pygame_gui.core import IncrementalThreadedResourceLoader
+from leaderboard import Leaderboard
+import assets
 
 
 SCREEN_COLOR = pg.Color('#9bddf9')
 SETTINGS_COLOR = pg.Color('#6bb6ff')
+OPTIONS_FONT = 'fonts/Prodelt Co.ttf'
+OPTION_COLOR = (154, 167, 177)
+OPTION_HOVER_COLOR = (243, 166, 148)
 
 
 class Menu:
@@ -23,10 +28,8 @@ class Menu:
         pg.init()
         pg.mouse.set_cursor(pg.cursors.diamond)
 
-        pause_sound = pg.mixer.Sound('music/pause.mp3')
-        pause_sound.set_volume(0.3)
-        click_sound = pg.mixer.Sound('music/click.wav')
-        click_sound.set_volume(0.3)
+        pause_sound = assets.get_sound('music/pause.mp3', 0.3)
+        click_sound = assets.get_sound('music/click.wav', 0.3)
 
         self.menu_type = menu_type
         self.screen_size = screen_size
@@ -132,15 +135,17 @@ class MainMenu(Menu):
         self.screen = screen
         self.add_options('Start')
         self.add_options('Settings')
+        self.add_options('Leaderboard')
         self.add_options('Quit')
         self.option_rects = []
         self.option_info = []
         self.return_option = ''
 
-        default_color = (154, 167, 177)
-        options_font = pg.font.Font('fonts/Prodelt Co.ttf', 40)
+        options_font = assets.get_font(OPTIONS_FONT, 40)
         for option in self.options:
-            text_surface = options_font.render(option[0], True, default_color)
+            text_surface = assets.render_text(options_font, option[0], OPTION_COLOR)
+            # The hover state is rendered up front too, so hovering never renders text
+            assets.render_text(options_font, option[0], OPTION_HOVER_COLOR)
             text_rect = text_surface.get_rect()
             text_rect.center = option[1]
             self.option_rects.append(text_rect)
@@ -158,7 +163,7 @@ class MainMenu(Menu):
         self.options.append(text)
 
     def display(self, on) -> str:
-        logo = pg.image.load("images/logo.png").convert_alpha()
+        logo = assets.get_image("images/logo.png")
         logo_rect = logo.get_rect()
         logo_size = logo.get_size()
         logo_rect.topleft = (self.screen_size[0] / 2 - logo_size[0] / 2, self.screen_size[1] * 0.08)
@@ -177,20 +182,12 @@ class MainMenu(Menu):
                             on = False
             self.screen.fill(SCREEN_COLOR)
 
-            default_color = (154, 167, 177)
-            hover_color = (243, 166, 148)
+            options_font = assets.get_font(OPTIONS_FONT, 40)
 
-            options_font = pg.font.Font('fonts/Prodelt Co.ttf', 40)
-
-            for option in self.options:
-                text_surface = options_font.render(option[0], True, default_color)
-                text_rect = text_surface.get_rect()
-                text_rect.center = option[1]
-
-                if text_rect.collidepoint(mouse_pos):
-                    text_surface = options_font.render(option[0], True, hover_color)
-
-                self.screen.blit(text_surface, text_rect)
+            # The options are only rendered once in each color, and then reused from the asset cache
+            for text_rect, option in self.option_info:
+                color = OPTION_HOVER_COLOR if text_rect.collidepoint(mouse_pos) else OPTION_COLOR
+                self.screen.blit(assets.render_text(options_font, option, color), text_rect)
 
             self.screen.blit(logo, logo_rect)
             pg.display.update()
@@ -203,28 +200,30 @@ class Settings(Menu):
     mode: str
     option: str
     _map_menu: pg_gui.elements.UIDropDownMenu
+    _map_list: List[str]
+    _map_menu_rect: pg.Rect
     _mode_menu: pg_gui.elements.UIDropDownMenu
     _logout_button: pg_gui.elements.UIButton
     _exit: pg_gui.elements.UIButton
 
-    def __init__(self, screen_size: Tuple[int, int], screen: pg.Surface):
-        """Initializes Settings menu with given screen"""
+    def __init__(self, screen_size: Tuple[int, int], screen: pg.Surface, map_ids: List[int]):
+        """Initializes Settings menu with given screen, listing the maps with the given ids
+        (see Game.get_map_ids)"""
         Menu.__init__(self, 'main', screen_size, screen)
         # Create Map Dropdown List
         map_menu_pos = (int(screen_size[0] * 0.3 - 75), int(screen_size[1] / 2 - 100))
         map_menu_rect = pg.Rect(map_menu_pos, (150, 50))
 
-        map_num = len([m for m in os.listdir('maps/')])
         map_list = []
-        for i in range(1, map_num + 1):
+        for i in map_ids:
             map_list.append('map{}'.format(i))
 
-        map_menu = pg_gui.elements.UIDropDownMenu(options_list=map_list, starting_option='map1',
+        map_menu = pg_gui.elements.UIDropDownMenu(options_list=map_list, starting_option=map_list[0],
                                                   relative_rect=map_menu_rect, manager=self.manager)
         # Create Settings Button
         mode_pos = (int(screen_size[0] * 0.7 - 75), int(screen_size[1] / 2 - 100))
         mode_rect = pg.Rect(mode_pos, (150, 50))
-        mode_menu = pg_gui.elements.UIDropDownMenu(options_list=['Shortest Path', 'User Control'],
+        mode_menu = pg_gui.elements.UIDropDownMenu(options_list=['Shortest Path', 'A* Search', 'User Control'],
                                                    starting_option='User Control',
                                                    relative_rect=mode_rect, manager=self.manager)
 
@@ -241,13 +240,24 @@ class Settings(Menu):
                                                text='Exit',
                                                manager=self.manager)
         self._map_menu = map_menu
+        self._map_list = map_list
+        self._map_menu_rect = map_menu_rect
         self._mode_menu = mode_menu
         self._logout_button = logout_button
         self._exit = exit_button
-        self.map_id = 1
+        self.map_id = map_ids[0]
         self.mode = 'User Control'
         self.option = ''
 
+    def set_map_id(self, map_id: int) -> None:
+        """Selects the map with the given id, also in the map dropdown list"""
+        # The selected option of a dropdown list is only set when it is created
+        self._map_menu.kill()
+        self._map_menu = pg_gui.elements.UIDropDownMenu(options_list=self._map_list,
+                                                        starting_option='map{}'.format(map_id),
+                                                        relative_rect=self._map_menu_rect, manager=self.manager)
+        self.map_id = map_id
+
     def display(self, on) -> str:
         while on:
             time_delta = self.clock.tick(60) / 1000.0
@@ -263,7 +273,7 @@ class Settings(Menu):
                 if event.type == pg.USEREVENT:
                     if event.user_type == pg_gui.UI_DROP_DOWN_MENU_CHANGED:
                         if event.ui_element == self._map_menu:
-                            self.map_id = int(event.text[-1])
+                            self.map_id = int(event.text[len('map'):])
                         if event.ui_element == self._mode_menu:
                             self.mode = event.text
                     if event.user_type == pg_gui.UI_BUTTON_PRESSED:
@@ -287,6 +297,79 @@ class Settings(Menu):
         return self.option
 
 
+class LeaderboardMenu(Menu):
+    _text_box: pg_gui.elements.UITextBox
+    _exit: pg_gui.elements.UIButton
+
+    def __init__(self, screen_size: Tuple[int, int], screen: pg.Surface):
+        """Initializes Leaderboard menu with given screen"""
+        Menu.__init__(self, 'main', screen_size, screen)
+        # Create Rankings Text Box
+        text_box_pos = (int(screen_size[0] * 0.1), int(screen_size[1] * 0.1))
+        text_box_rect = pg.Rect(text_box_pos, (int(screen_size[0] * 0.8), int(screen_size[1] * 0.65)))
+        text_box = pg_gui.elements.UITextBox(relative_rect=text_box_rect,
+                                             html_text='',
+                                             manager=self.manager)
+        # Create exit button
+        exit_button_pos = (int(screen_size[0] * 0.8), int(screen_size[1] * 0.8))
+        exit_button_rect = pg.Rect(exit_button_pos, (120, 40))
+        exit_button = pg_gui.elements.UIButton(relative_rect=exit_button_rect,
+                                               text='Exit',
+                                               manager=self.manager)
+        self._text_box = text_box
+        self._exit = exit_button
+
+    def display(self, on, player_id: str = 'Default', map_id: int = 1) -> None:
+        if on:
+            # The rankings are read once per opening, from the aggregates kept by the leaderboard
+            with Leaderboard() as leaderboard:
+                self._text_box.set_text(leaderboard_text(leaderboard, player_id, map_id))
+        while on:
+            time_delta = self.clock.tick(60) / 1000.0
+            for event in pg.event.get():
+                if event.type == pg.QUIT:
+                    on = False
+                    pg.quit()
+                if event.type == KEYDOWN:
+                    if event.key == K_ESCAPE:
+                        self.sound['pause'].play()
+                        on = False
+
+                if event.type == pg.USEREVENT:
+                    if event.user_type == pg_gui.UI_BUTTON_PRESSED:
+                        self.sound['click'].play()
+                        if event.ui_element == self._exit:
+                            on = False
+
+                self.manager.process_events(event)
+
+            self.manager.update(time_delta)
+
+            self.screen.fill(SETTINGS_COLOR)
+            self.manager.draw_ui(self.screen)
+
+            pg.display.update()
+
+
+def leaderboard_text(leaderboard: Leaderboard, player_id: str, map_id: int, limit: int = 5) -> str:
+    """Returns the rankings shown on the leaderboard menu, as html text
+
+    Player ids are entered freely, so they are escaped before being put in the html.
+    """
+    lines = ['<b>Most treasures</b>']
+    lines += ['{}. {} - {}'.format(i + 1, html.escape(player), value)
+              for i, (player, value) in enumerate(leaderboard.get_player_ranking('treasures', limit))]
+    lines.append('<b>Most games played</b>')
+    lines += ['{}. {} - {}'.format(i + 1, html.escape(player), value)
+              for i, (player, value) in enumerate(leaderboard.get_player_ranking('games_played', limit))]
+    lines.append('<b>Fewest moves on map{}</b>'.format(map_id))
+    lines += ['{}. {} - {}'.format(i + 1, html.escape(player), move_count)
+              for i, (player, _, move_count) in enumerate(leaderboard.get_fewest_moves(map_id, limit))]
+    lines.append('<b>Last games of {}</b>'.format(html.escape(player_id)))
+    lines += ['map{} - {} moves'.format(*row) for row in leaderboard.get_player_history(player_id, limit)]
+    return '<br>'.join(lines)
+
+
 class Pause(Menu):
     _exit: pg_gui.elements.UIButton
     _continue: pg_gui.elements.UIButton
@@ -319,8 +402,6 @@ class Pause(Menu):
         self.return_option = ''
 
     def display(self, on) -> str:
-        click_sound = pg.mixer.Sound('music/click.wav')
-        click_sound.set_volume(0.3)
         while on:
             time_delta = self.clock.tick(60) / 1000.0
             for event in pg.event.get():
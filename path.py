@@ -3,16 +3,39 @@ a number of game runs with a fixed map.
 """
 
 from __future__ import annotations
-from typing import Tuple, List, Optional
-import pandas as pd
-import pygame as pg
-from map import GameMap
+from typing import Callable, Dict, Iterable, Iterator, Tuple, List, Optional
+from collections.abc import Mapping
+from collections import deque
+import heapq
+from map import GameMap, OBSTACLE_LAYER, TREASURE_LAYER, import_pandas
+import csv
 import os
+import re
+import struct
+
+PATH_DIR = 'paths'
+PATH_FILE_PATTERN = re.compile(r'^path(\d+)\.(csv|tpath)$')
+
+# Compact path format (.tpath): a fixed little-endian header, the utf-8 player id, then
+# the recorded moves from initial_pos as uint16 runs. Each run holds a direction code in
+# its lowest 3 bits and the number of repeated moves in the other 13 bits. Version 1
+# paths had no code for zero-length moves, and held the direction code in 2 bits.
+PATH_MAGIC = b'TPTH'
+PATH_VERSION = 2
+PATH_HEADER = struct.Struct('<4sHIhhHHH')
+PATH_RUN_COUNT = struct.Struct('<I')
+RUN_CODE_BITS = {1: 2, 2: 3}
+MAX_RUN_LENGTH = (1 << (16 - RUN_CODE_BITS[PATH_VERSION])) - 1
+# Direction codes of unit moves, given by the sign of their change in (x, y). A move
+# that stays in place has its own code, so it is still counted in move_count.
+MOVE_CODES = {(-1, 0): 0, (1, 0): 1, (0, -1): 2, (0, 1): 3, (0, 0): 4}
+MOVE_DIRECTIONS = {code: direction for direction, code in MOVE_CODES.items()}
 
 
 class _Vertex:
     """A vertex in a graph.
     """
+    __slots__ = ('pos', 'neighbours')
     pos: Tuple[int, int]
     neighbours: set[_Vertex]
 
@@ -27,20 +50,24 @@ class _Vertex:
         """Return whether this vertex is connected to a vertex corresponding to
         target_item, by a path that DOES NOT use any vertex in visited.
 
+        The traversal uses an explicit stack, so long paths do not reach the
+        recursion limit.
+
         Preconditions:
             - self not in visited
         """
-        if self.pos == target_pos:
-            return True
-        else:
-            visited.add(self)
-            # (for loop version)
-            for u in self.neighbours:
-                if u not in visited:
-                    if u.check_connected(target_pos, visited):
-                        return True
+        stack = [self]
+        while stack:
+            vertex = stack.pop()
+            if vertex.pos == target_pos:
+                return True
+            if vertex not in visited:
+                visited.add(vertex)
+                for u in vertex.neighbours:
+                    if u not in visited:
+                        stack.append(u)
 
-            return False
+        return False
 
     def print_all_connected(self, visited: set[_Vertex]) -> None:
         """
@@ -49,22 +76,27 @@ class _Vertex:
         Preconditions:
             - self not in visited
         """
-        visited.add(self)
-        print(self.pos)
-
-        for u in self.neighbours:
-            if u not in visited:
-                u.print_all_connected(visited)
+        stack = [self]
+        while stack:
+            vertex = stack.pop()
+            if vertex not in visited:
+                visited.add(vertex)
+                print(vertex.pos)
+                for u in vertex.neighbours:
+                    if u not in visited:
+                        stack.append(u)
 
 
 class Graph:
     """A graph.
     """
     _vertices: dict[str, _Vertex]
+    _components: Optional[Dict[Tuple[int, int], int]]
 
     def __init__(self) -> None:
         """Initialize an empty graph (no vertices or edges)."""
         self._vertices = dict()
+        self._components = None
 
     def length(self) -> int:
         """Returns the number of vertices"""
@@ -74,6 +106,10 @@ class Graph:
         """Return the vertex at the input position"""
         return self._vertices[str(pos)]
 
+    def has_vertex(self, pos: Tuple[int, int]) -> bool:
+        """Return whether there is a vertex at the input position"""
+        return str(pos) in self._vertices
+
     def get_vertices(self) -> dict[str, _Vertex]:
         """Return _vertices"""
         return self._vertices
@@ -85,6 +121,7 @@ class Graph:
         """
         new_vertex = _Vertex(pos, set())
         self._vertices[str(pos)] = new_vertex
+        self._components = None
 
     def add_edge(self, pos1: Tuple[int, int], pos2: Tuple[int, int]) -> None:
         """Add an edge between the two vertices with the given items in this graph.
@@ -101,9 +138,295 @@ class Graph:
 
             v1.neighbours.add(v2)
             v2.neighbours.add(v1)
+            self._components = None
         else:
             raise ValueError
 
+    def get_edges(self) -> List[Tuple[Tuple[int, int], Tuple[int, int]]]:
+        """Return the positions of the two ends of each edge, listing each edge once"""
+        edges = []
+        for vertex in self.get_vertices().values():
+            for neighbour in vertex.neighbours:
+                if vertex.pos < neighbour.pos:
+                    edges.append((vertex.pos, neighbour.pos))
+        return edges
+
+    def connected_components(self) -> Dict[Tuple[int, int], int]:
+        """Return a mapping from the position of each vertex to the label of its
+        connected component.
+
+        Two vertices are connected exactly when they have the same label. The labels
+        are computed with one traversal of the whole graph, and are kept until a
+        vertex or edge is added.
+        """
+        if self._components is None:
+            self._components = self._label_components()
+        return self._components
+
+    def is_connected(self, pos1: Tuple[int, int], pos2: Tuple[int, int]) -> bool:
+        """Return whether there is a path between the vertices at the two positions.
+
+        Raise a ValueError if pos1 or pos2 do not appear as vertices in this graph.
+        """
+        components = self.connected_components()
+        if pos1 not in components or pos2 not in components:
+            raise ValueError
+        return components[pos1] == components[pos2]
+
+    def _label_components(self) -> Dict[Tuple[int, int], int]:
+        """Label every vertex with its connected component, using one flood fill per
+        component"""
+        components = {}
+        label = 0
+        for start in self.get_vertices().values():
+            if start.pos in components:
+                continue
+            components[start.pos] = label
+            stack = [start]
+            while stack:
+                vertex = stack.pop()
+                for u in vertex.neighbours:
+                    if u.pos not in components:
+                        components[u.pos] = label
+                        stack.append(u)
+            label += 1
+        return components
+
+
+
+class _CompactVertex:
+    """A lightweight view of a vertex stored in a CompactGraph.
+
+    The view only holds the graph and the integer id of the cell. Its position and
+    neighbours are looked up in the graph whenever they are accessed, and it has the
+    same pos and neighbours attributes as _Vertex.
+    """
+    __slots__ = ('_graph', '_id')
+    _graph: CompactGraph
+    _id: int
+
+    def __init__(self, graph: CompactGraph, vertex_id: int) -> None:
+        """Initialize a view of the vertex with the given id in graph."""
+        self._graph = graph
+        self._id = vertex_id
+
+    @property
+    def pos(self) -> Tuple[int, int]:
+        """Return the position of this vertex"""
+        return self._graph.id_to_pos(self._id)
+
+    @property
+    def neighbours(self) -> Tuple[_CompactVertex, ...]:
+        """Return the vertices adjacent to this vertex"""
+        return tuple(_CompactVertex(self._graph, n) for n in self._graph.neighbour_ids(self._id))
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, _CompactVertex) and other._graph is self._graph and other._id == self._id
+
+    def __hash__(self) -> int:
+        return hash((id(self._graph), self._id))
+
+
+class _CompactVertices(Mapping):
+    """A read-only mapping from str(pos) to the vertices of a CompactGraph.
+
+    This mirrors the dictionary returned by Graph.get_vertices, without storing a
+    string key or a vertex object for every cell.
+    """
+    _graph: CompactGraph
+
+    def __init__(self, graph: CompactGraph) -> None:
+        self._graph = graph
+
+    def __getitem__(self, key: str) -> _CompactVertex:
+        try:
+            pos = tuple(int(v) for v in key[1:-1].split(','))
+            vertex_id = self._graph.pos_to_id(pos)
+        except ValueError:
+            raise KeyError(key)
+        if not self._graph.has_id(vertex_id):
+            raise KeyError(key)
+        return _CompactVertex(self._graph, vertex_id)
+
+    def __iter__(self) -> Iterator[str]:
+        return (str(self._graph.id_to_pos(i)) for i in self._graph.vertex_ids())
+
+    def __len__(self) -> int:
+        return self._graph.length()
+
+    def values(self) -> List[_CompactVertex]:
+        return [_CompactVertex(self._graph, i) for i in self._graph.vertex_ids()]
+
+
+class CompactGraph(Graph):
+    """A graph over the cells of a div x div grid, stored in flat arrays.
+
+    Each cell (i, j) has the integer id i * div + j, and sits at the position
+    (origin[0] + i * h_step, origin[1] + j * v_step). Vertices can only be adjacent
+    to the cells directly left, right, above or below them, so the neighbours of a
+    cell are stored as a 4-bit mask.
+
+    This has the same interface as Graph, and can be used in its place by Path.
+    """
+    _div: int
+    _h_step: int
+    _v_step: int
+    _origin: Tuple[int, int]
+    _present: bytearray
+    _adjacency: bytearray
+    _count: int
+
+    # Bit of the adjacency mask for each neighbouring cell, given by its change in (i, j)
+    _DIRECTIONS = {(-1, 0): 1, (1, 0): 2, (0, -1): 4, (0, 1): 8}
+
+    def __init__(self, div: int, step: Tuple[int, int], origin: Tuple[int, int]) -> None:
+        """Initialize an empty graph (no vertices or edges) over a div x div grid."""
+        Graph.__init__(self)
+        self._div = div
+        self._h_step, self._v_step = step
+        self._origin = origin
+        self._present = bytearray(div * div)
+        self._adjacency = bytearray(div * div)
+        self._count = 0
+
+    @classmethod
+    def for_grid(cls, screen_size: Tuple[int, int], div: int, rect_size: Tuple[int, int]) -> CompactGraph:
+        """Return an empty graph whose cells are the player positions of a game grid"""
+        step = (int(screen_size[0] / div), int(screen_size[1] / div))
+        origin = (int(-rect_size[0] / 2), int(-rect_size[1] / 2))
+        return cls(div, step, origin)
+
+    def pos_to_id(self, pos: Tuple[int, int]) -> int:
+        """Return the id of the cell at the input position
+
+        Raise a ValueError if the position is not on the grid.
+        """
+        i, x_rem = divmod(pos[0] - self._origin[0], self._h_step)
+        j, y_rem = divmod(pos[1] - self._origin[1], self._v_step)
+        if x_rem != 0 or y_rem != 0 or not 0 <= i < self._div or not 0 <= j < self._div:
+            raise ValueError
+        return i * self._div + j
+
+    def id_to_pos(self, vertex_id: int) -> Tuple[int, int]:
+        """Return the position of the cell with the input id"""
+        i, j = divmod(vertex_id, self._div)
+        return self._origin[0] + i * self._h_step, self._origin[1] + j * self._v_step
+
+    def has_id(self, vertex_id: int) -> bool:
+        """Return whether the cell with the input id is a vertex of this graph"""
+        return bool(self._present[vertex_id])
+
+    def vertex_ids(self) -> Iterator[int]:
+        """Return the ids of all vertices in this graph"""
+        return (i for i, present in enumerate(self._present) if present)
+
+    def neighbour_ids(self, vertex_id: int) -> List[int]:
+        """Return the ids of the vertices adjacent to the input vertex"""
+        mask = self._adjacency[vertex_id]
+        neighbours = []
+        for (di, dj), bit in self._DIRECTIONS.items():
+            if mask & bit:
+                neighbours.append(vertex_id + di * self._div + dj)
+        return neighbours
+
+    def length(self) -> int:
+        """Returns the number of vertices"""
+        return self._count
+
+    def get_edges(self) -> List[Tuple[Tuple[int, int], Tuple[int, int]]]:
+        """Return the positions of the two ends of each edge, listing each edge once"""
+        edges = []
+        for vertex_id in self.vertex_ids():
+            mask = self._adjacency[vertex_id]
+            # Only the edges to the right and lower neighbours are listed from each vertex
+            if mask & self._DIRECTIONS[(1, 0)]:
+                edges.append((self.id_to_pos(vertex_id), self.id_to_pos(vertex_id + self._div)))
+            if mask & self._DIRECTIONS[(0, 1)]:
+                edges.append((self.id_to_pos(vertex_id), self.id_to_pos(vertex_id + 1)))
+        return edges
+
+    def get_vertex(self, pos: Tuple[int, int]) -> _CompactVertex:
+        """Return the vertex at the input position
+
+        Raise a KeyError if there is no vertex at the position.
+        """
+        try:
+            vertex_id = self.pos_to_id(pos)
+        except ValueError:
+            raise KeyError(str(pos))
+        if not self._present[vertex_id]:
+            raise KeyError(str(pos))
+        return _CompactVertex(self, vertex_id)
+
+    def has_vertex(self, pos: Tuple[int, int]) -> bool:
+        """Return whether there is a vertex at the input position"""
+        try:
+            return bool(self._present[self.pos_to_id(pos)])
+        except ValueError:
+            return False
+
+    def get_vertices(self) -> _CompactVertices:
+        """Return a mapping from str(pos) to each vertex of this graph"""
+        return _CompactVertices(self)
+
+    def add_vertex(self, pos: Tuple[int, int]) -> None:
+        """Add a vertex with the given position to this graph.
+
+        The new vertex is not adjacent to any other vertices. Adding an existing
+        vertex again keeps its edges.
+
+        Raise a ValueError if the position is not on the grid.
+        """
+        vertex_id = self.pos_to_id(pos)
+        if not self._present[vertex_id]:
+            self._present[vertex_id] = 1
+            self._count += 1
+            self._components = None
+
+    def add_edge(self, pos1: Tuple[int, int], pos2: Tuple[int, int]) -> None:
+        """Add an edge between the two vertices with the given positions in this graph.
+
+        Adding an edge from a vertex to itself does nothing.
+
+        Raise a ValueError if pos1 or pos2 do not appear as vertices in this graph,
+        or if they are not adjacent cells of the grid.
+        """
+        id1 = self.pos_to_id(pos1)
+        id2 = self.pos_to_id(pos2)
+        if not (self._present[id1] and self._present[id2]):
+            raise ValueError
+        if id1 == id2:
+            return
+
+        (i1, j1), (i2, j2) = divmod(id1, self._div), divmod(id2, self._div)
+        direction = (i2 - i1, j2 - j1)
+        if direction not in self._DIRECTIONS:
+            raise ValueError
+        self._adjacency[id1] |= self._DIRECTIONS[direction]
+        self._adjacency[id2] |= self._DIRECTIONS[(-direction[0], -direction[1])]
+        self._components = None
+
+    def _label_components(self) -> Dict[Tuple[int, int], int]:
+        """Label every vertex with its connected component, flood filling over the
+        cell ids"""
+        labels = [-1] * len(self._present)
+        components = {}
+        label = 0
+        for start in self.vertex_ids():
+            if labels[start] != -1:
+                continue
+            labels[start] = label
+            stack = [start]
+            while stack:
+                vertex_id = stack.pop()
+                components[self.id_to_pos(vertex_id)] = label
+                for n in self.neighbour_ids(vertex_id):
+                    if labels[n] == -1:
+                        labels[n] = label
+                        stack.append(n)
+            label += 1
+        return components
+
 
 class Path:
     """A path that records player's path movements utilizing the Graph
@@ -115,12 +438,18 @@ class Path:
     all_pos: List[Tuple[int, int]]
     _map_id: int
     _graph: Graph
+    _costs: Dict[Tuple[int, int], float]
     _player_id: str
+    _recorder: Optional[Callable[[Tuple[int, int]], None]]
 
     def __init__(self, initial_pos: Tuple[int, int],
                  map_id: Optional[int] = 1,
-                 player_id: Optional[str] = "Default") -> None:
-        """Initialize the default path with the given graph and map"""
+                 player_id: Optional[str] = "Default",
+                 graph: Optional[Graph] = None) -> None:
+        """Initialize the default path with the given graph and map
+
+        If no graph is given, the path is recorded in a new Graph.
+        """
         self.initial_pos = initial_pos
         self.move_count = 0
         self.all_pos = list()
@@ -129,8 +458,10 @@ class Path:
         self.pos_record.append(initial_pos)
         self._map_id = map_id
         self._player_id = player_id
-        self._graph = Graph()
+        self._graph = Graph() if graph is None else graph
         self._graph.add_vertex(initial_pos)
+        self._costs = dict()
+        self._recorder = None
 
     def get_graph(self) -> Graph:
         """Return the Graph"""
@@ -144,28 +475,56 @@ class Path:
         """Returns the corresponding game_map"""
         return self._map_id
 
-    def set_general_paths(self, game_map: GameMap, rect_size: Tuple[int, int]):
-        """Returns a path traversing through all possible routes"""
+    def get_player(self) -> str:
+        """Returns the id of the player who made the path"""
+        return self._player_id
+
+    def set_recorder(self, recorder: Optional[Callable[[Tuple[int, int]], None]]) -> None:
+        """Sets a function that is called with each new position added by update_path,
+        such as SessionRecorder.record"""
+        self._recorder = recorder
+
+    def set_general_paths(self, game_map: GameMap, rect_size: Tuple[int, int],
+                          weighted: Optional[bool] = False):
+        """Returns a path traversing through all possible routes
+
+        Each candidate position is indexed by its grid coordinate (i, j), so the
+        neighbours of a cell are found directly at (i + 1, j) and (i, j + 1)
+        instead of comparing every pair of positions. The objects at each cell are
+        read from the cell-occupancy index of the map (see GameMap.get_cell_index).
+
+        If weighted is True, cells covered by obstacles listed in the map's terrain
+        costs are kept in the graph, and moving into them costs the terrain cost.
+        """
         div = game_map.get_div()
         h_step, v_step = game_map.get_step()
-        obstacles = [x[0] for x in game_map.get_obstacles()]
-        treasures = game_map.get_treasures()
-        all_pos = []
+        terrain_cost = game_map.get_terrain_costs() if weighted else {}
+        obstacles = game_map.get_obstacles()
+        index = game_map.get_cell_index(rect_size)
+        grid_pos = {}
         for i in range(1, div):
             for j in range(1, div):
+                if index[TREASURE_LAYER, i, j] != -1:
+                    continue
+                obstacle_id = index[OBSTACLE_LAYER, i, j]
+                # A cell holds an obstacle that cannot be crossed wherever one covers it
+                if obstacle_id != -1 and obstacles[obstacle_id][1] not in terrain_cost:
+                    continue
                 x = int(i * h_step - rect_size[0] / 2)
                 y = int(j * v_step - rect_size[1] / 2)
-                temp_rect = pg.Rect((x, y), rect_size)
-                if temp_rect.collidelist(obstacles) == -1 and temp_rect.collidelist(treasures) == -1:
-                    all_pos.append((x, y))
-                    self._graph.add_vertex((x, y))
-        for pos1 in all_pos:
-            for pos2 in all_pos:
-                if pos1 != pos2:
-                    if abs(pos1[0] - pos2[0]) == 0 and abs(pos1[1] - pos2[1]) == v_step:
-                        self._graph.add_edge(pos1, pos2)
-                    if abs(pos1[1] - pos2[1]) == 0 and abs(pos1[0] - pos2[0]) == h_step:
-                        self._graph.add_edge(pos1, pos2)
+                grid_pos[(i, j)] = (x, y)
+                self._graph.add_vertex((x, y))
+                if obstacle_id != -1:
+                    self._costs[(x, y)] = terrain_cost[obstacles[obstacle_id][1]]
+        # Only the right and lower neighbours are checked, as each edge is undirected
+        for (i, j), pos in grid_pos.items():
+            for neighbour in ((i + 1, j), (i, j + 1)):
+                if neighbour in grid_pos:
+                    self._graph.add_edge(pos, grid_pos[neighbour])
+
+    def get_cost(self, pos1: Tuple[int, int], pos2: Tuple[int, int]) -> float:
+        """Returns the cost of moving from pos1 to the adjacent position pos2"""
+        return self._costs.get(pos2, 1)
 
     def update_path(self, new_pos: Tuple[int, int]) -> None:
         """Add a new position (Vertex) to the path (_graph)
@@ -177,41 +536,198 @@ class Path:
         current = self.pos_record[-1]
 
         self.pos_record.append(new_pos)
-        if str(new_pos) not in self._graph.get_vertices():
+        if not self._graph.has_vertex(new_pos):
             self._graph.add_vertex(new_pos)
             self.all_pos.append(new_pos)
 
         self._graph.add_edge(current, new_pos)
+        if self._recorder is not None:
+            self._recorder(new_pos)
 
-    def shortest_path(self, pos1: Tuple[int, int], pos2: Tuple[int, int]) -> List[Tuple[int, int]]:
-        """Returns a list of positions that constitutes the shortest path from one position to the next"""
+    def shortest_path(self, pos1: Tuple[int, int],
+                      pos2: Tuple[int, int]) -> Optional[List[Tuple[int, int]]]:
+        """Returns a list of positions that constitutes the shortest path from one position to the next
 
-        visited = []
+        The returned list starts at pos1 and ends at pos2. Returns None if pos2 cannot be
+        reached from pos1.
 
-        current_queue = [[pos1]]
+        Raise a ValueError if pos1 or pos2 do not appear as vertices in the graph.
+        """
+        if not (self._graph.has_vertex(pos1) and self._graph.has_vertex(pos2)):
+            raise ValueError
+        if not self._graph.is_connected(pos1, pos2):
+            return None
+
+        # Each visited position points to the position it was reached from
+        parents = {pos1: None}
+        current_queue = deque([pos1])
 
         # Traversing graph
         while current_queue:
-            path = current_queue.pop(0)
-            vertex = path[-1]
+            vertex = current_queue.popleft()
+            if vertex == pos2:
+                break
+
+            for neighbour in self._graph.get_vertex(vertex).neighbours:
+                if neighbour.pos not in parents:
+                    parents[neighbour.pos] = vertex
+                    current_queue.append(neighbour.pos)
+        else:
+            return None
+
+        # Follows the parent pointers back from the target to rebuild the path
+        path = []
+        pos = pos2
+        while pos is not None:
+            path.append(pos)
+            pos = parents[pos]
+        path.reverse()
+        return path
+
+    def a_star(self, pos1: Tuple[int, int], pos2: Tuple[int, int], step: Tuple[int, int],
+               cost: Optional[Callable[[Tuple[int, int], Tuple[int, int]], float]] = None
+               ) -> Optional[List[Tuple[int, int]]]:
+        """Returns a list of positions that constitutes the cheapest path from one position to the next
+
+        The search is guided by the Manhattan distance to pos2, counted in movement steps
+        given by step (see GameMap.get_step). cost returns the cost of moving between two
+        adjacent positions, and defaults to get_cost. Every move must cost at least 1, so
+        that the heuristic never overestimates.
+
+        The returned list starts at pos1 and ends at pos2. Returns None if pos2 cannot be
+        reached from pos1.
+
+        Raise a ValueError if pos1 or pos2 do not appear as vertices in the graph.
+        """
+        if not (self._graph.has_vertex(pos1) and self._graph.has_vertex(pos2)):
+            raise ValueError
+        if not self._graph.is_connected(pos1, pos2):
+            return None
+        if cost is None:
+            cost = self.get_cost
+
+        h_step, v_step = step
+
+        def heuristic(pos: Tuple[int, int]) -> float:
+            return abs(pos[0] - pos2[0]) / h_step + abs(pos[1] - pos2[1]) / v_step
+
+        parents = {pos1: None}
+        distances = {pos1: 0}
+        # Entries are (estimated total cost, insertion order, position). The insertion
+        # order breaks ties so that positions themselves are never compared.
+        counter = 0
+        open_heap = [(heuristic(pos1), counter, pos1)]
+        closed = set()
+
+        while open_heap:
+            _, _, vertex = heapq.heappop(open_heap)
+            if vertex == pos2:
+                break
+            if vertex in closed:
+                continue
+            closed.add(vertex)
+
+            for neighbour in self._graph.get_vertex(vertex).neighbours:
+                new_distance = distances[vertex] + cost(vertex, neighbour.pos)
+                if neighbour.pos not in distances or new_distance < distances[neighbour.pos]:
+                    distances[neighbour.pos] = new_distance
+                    parents[neighbour.pos] = vertex
+                    counter += 1
+                    heapq.heappush(open_heap, (new_distance + heuristic(neighbour.pos), counter, neighbour.pos))
+        else:
+            return None
+
+        path = []
+        pos = pos2
+        while pos is not None:
+            path.append(pos)
+            pos = parents[pos]
+        path.reverse()
+        return path
+
+    def get_steps(self) -> Tuple[int, int]:
+        """Return the horizontal and vertical step size of the recorded moves, or 0 for
+        a direction the path never moved in"""
+        h_step, v_step = 0, 0
+        for pos1, pos2 in zip(self.pos_record, self.pos_record[1:]):
+            h_step = h_step or abs(pos2[0] - pos1[0])
+            v_step = v_step or abs(pos2[1] - pos1[1])
+        return h_step, v_step
+
+    def get_move_runs(self) -> List[Tuple[int, int]]:
+        """Return the recorded moves from initial_pos as (direction code, length) runs
+
+        Recorded positions that repeat the previous position are kept as moves that stay
+        in place, so the path has as many moves as move_count after it is reloaded.
+
+        Raise a ValueError if the path contains a move that is not a single step.
+        """
+        h_step, v_step = self.get_steps()
+        runs = []
+        for pos1, pos2 in zip(self.pos_record, self.pos_record[1:]):
+            dx, dy = pos2[0] - pos1[0], pos2[1] - pos1[1]
+            if abs(dx) not in (0, h_step) or abs(dy) not in (0, v_step):
+                raise ValueError('Move from {} to {} is not a single step'.format(pos1, pos2))
+            code = MOVE_CODES.get(((dx > 0) - (dx < 0), (dy > 0) - (dy < 0)))
+            if code is None:
+                raise ValueError('Move from {} to {} is not a single step'.format(pos1, pos2))
+
+            if runs and runs[-1][0] == code and runs[-1][1] < MAX_RUN_LENGTH:
+                runs[-1] = (code, runs[-1][1] + 1)
+            else:
+                runs.append((code, 1))
+        return runs
+
+    def to_bytes(self) -> bytes:
+        """Returns the path in the compact path format
+
+        Raise a ValueError if the path contains a move that is not a single step.
+        """
+        runs = self.get_move_runs()
+        h_step, v_step = self.get_steps()
+        player_id = str(self._player_id).encode('utf-8')
+        header = PATH_HEADER.pack(PATH_MAGIC, PATH_VERSION, self._map_id, self.initial_pos[0],
+                                  self.initial_pos[1], h_step, v_step, len(player_id))
+        packed_runs = struct.pack('<{}H'.format(len(runs)),
+                                  *[(length << RUN_CODE_BITS[PATH_VERSION]) | code for code, length in runs])
+        return header + player_id + PATH_RUN_COUNT.pack(len(runs)) + packed_runs
+
+    def load_bytes(self, data: bytes) -> None:
+        """Rebuilds the path from data in the compact path format, replaying each move
+
+        Raise a ValueError if data is not a path in the compact format.
+        """
+        player_id, map_id, initial_pos, steps, moves = _decode_path(data)
+        self.initial_pos = initial_pos
+        self.move_count = 0
+        self.all_pos = [initial_pos]
+        self.pos_record = [initial_pos]
+        self._graph.add_vertex(initial_pos)
+        self._player_id = player_id
+        self._map_id = map_id
 
-            if vertex not in visited:
-                neighbours = self._graph.get_vertex(vertex).neighbours
+        pos = initial_pos
+        for dx, dy in moves:
+            pos = (pos[0] + dx * steps[0], pos[1] + dy * steps[1])
+            self.update_path(pos)
 
-                for neighbour in neighbours:
-                    path_gen = list(path)
-                    path_gen.append(neighbour.pos)
-                    current_queue.append(path_gen)
+    def write_path(self, binary: Optional[bool] = False) -> None:
+        """Saves relevant information for the current path to file
 
-                    if neighbour.pos == pos2:
-                        return path_gen
-                visited.append(vertex)
+        If binary is True, the path is saved as path[num].tpath in the compact path format,
+        which only stores the recorded moves. Otherwise, the whole graph is saved to
+        path[num].csv.
+        """
+        # Follows the largest existing path id from directory
+        self.path_id = max((path_id for path_id, _ in list_path_files()), default=0) + 1
+
+        if binary:
+            data = self.to_bytes()
+            with open(os.path.join(PATH_DIR, 'path{}.tpath'.format(self.path_id)), 'wb') as file:
+                file.write(data)
+            return
 
-    def write_path(self) -> None:
-        """Saves relevant information for the current path to file"""
-        # Returns number of existing paths from directory
-        path_num = len([m for m in os.listdir('paths/')])
-        self.path_id = path_num + 1
+        pd = import_pandas()
 
         # Retrieves specific object information, save to dataframe
         player_id = pd.DataFrame({'player_id': self._player_id}, index=[0])
@@ -230,17 +746,27 @@ class Path:
         # Sets new path name. This is given by 'path' + the path index.
         path_name = 'path{}.csv'.format(self.path_id)
         # Saves map file to directory
-        object_info.to_csv(os.path.join(r'paths\\', path_name), index=False)
+        object_info.to_csv(os.path.join(PATH_DIR, path_name), index=False)
 
     def read_path(self, path_file: str) -> None:
         """Reads a path from file, retrieving all relevant information required
-        to rebuild a path"""
+        to rebuild a path
+
+        Files ending in .tpath are read in the compact path format, others as csv.
+        """
+        if path_file.endswith('.tpath'):
+            with open(path_file, 'rb') as file:
+                self.load_bytes(file.read())
+            return
+
+        pd = import_pandas()
         # Reading path file
         df = pd.read_csv(path_file, index_col=False)
         # Retrieve vertices and settings for path, indexing by column name
         player_id = df['player_id'][0]
         map_id = int(df['map_id'][0])
-        initial_pos = df['initial_pos'][0]
+        # The x and y coordinates of the initial position are saved in the first two rows
+        initial_pos = (int(df['initial_pos'][0]), int(df['initial_pos'][1]))
         vertices = df['vertices'].tolist()
         neighbours = df['neighbours'].tolist()
 
@@ -263,3 +789,57 @@ class Path:
         self.initial_pos = initial_pos
         self._player_id = player_id
         self._map_id = map_id
+
+
+def list_path_files() -> List[Tuple[int, str]]:
+    """Return the id and file of every path saved under directory 'paths', in increasing
+    order of id"""
+    path_files = []
+    for file_name in os.listdir(PATH_DIR):
+        match = PATH_FILE_PATTERN.match(file_name)
+        if match:
+            path_files.append((int(match.group(1)), os.path.join(PATH_DIR, file_name)))
+    return sorted(path_files)
+
+
+def read_path_header(path_file: str) -> Tuple[str, int]:
+    """Return the player id and map id of a saved path, without reading the rest of
+    the file"""
+    if path_file.endswith('.tpath'):
+        with open(path_file, 'rb') as file:
+            header = file.read(PATH_HEADER.size)
+            _, _, map_id, _, _, _, _, name_length = PATH_HEADER.unpack(header)
+            return file.read(name_length).decode('utf-8'), map_id
+
+    with open(path_file, newline='') as file:
+        first_row = next(csv.DictReader(file))
+    return first_row['player_id'], int(float(first_row['map_id']))
+
+
+def _decode_path(data: bytes) -> Tuple[str, int, Tuple[int, int], Tuple[int, int], Iterable[Tuple[int, int]]]:
+    """Decodes a path in the compact path format.
+
+    Returns the player id, map id, initial position and step sizes, and an iterator over
+    the (dx, dy) sign of each move, which unpacks the runs as they are consumed.
+    """
+    if len(data) < PATH_HEADER.size:
+        raise ValueError('Path data is too short')
+    magic, version, map_id, x, y, h_step, v_step, name_length = PATH_HEADER.unpack_from(data)
+    if magic != PATH_MAGIC or version not in RUN_CODE_BITS:
+        raise ValueError('Not a version {} compact path'.format(PATH_VERSION))
+    code_bits = RUN_CODE_BITS[version]
+    offset = PATH_HEADER.size
+    player_id = bytes(data[offset:offset + name_length]).decode('utf-8')
+    offset += name_length
+    num_runs, = PATH_RUN_COUNT.unpack_from(data, offset)
+    offset += PATH_RUN_COUNT.size
+    if len(data) < offset + num_runs * 2:
+        raise ValueError('Path data is truncated')
+
+    def moves() -> Iterator[Tuple[int, int]]:
+        for run, in struct.iter_unpack('<H', data[offset:offset + num_runs * 2]):
+            direction = MOVE_DIRECTIONS[run & ((1 << code_bits) - 1)]
+            for _ in range(run >> code_bits):
+                yield direction
+
+    return player_id, map_id, (x, y), (h_step, v_step), moves()
@@ -1,7 +1,6 @@
 """
 This file contains the necessary class and methods for a player object
 """
-import pandas as pd
 
 
 class Player:
@@ -50,17 +49,3 @@ class Player:
         """Updates the current backpack of the indicated type(keys, fragments...)
         with the given value of change"""
         self.backpack[object_type] += change
-
-    def update_data(self, difficulty: int) -> None:
-        """Updates player data saved in player_stat.csv"""
-        df = pd.read_csv('player_stat.csv', index_col='player_id')
-        try:
-            df_player = df.loc[self.player_id]
-        except KeyError:
-            df.loc[self.player_id] = [1, self._vision_field, difficulty]
-        else:
-            df_player.loc['games_played'] += 1
-            df_player.loc['treasures'] += difficulty
-            df.loc[self.player_id] = df_player
-
-        df.to_csv('player_stat.csv')
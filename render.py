@@ -0,0 +1,285 @@
+"""
+This file contains the render layers of the game screen.
+
+Content that does not change during a game, such as the background, the grid and the
+obstacles shown in show-all mode, is drawn once onto cached surfaces, which are then
+blitted onto the screen each frame. The area revealed by the player's vision field only
+grows during a game, so it is updated from the newly visited positions alone.
+"""
+from typing import Any, List, Optional, Set, Tuple
+import pygame as pg
+from map import GameMap
+from path import Path
+
+BACKGROUND_COLOR = (248, 186, 182)
+GRID_COLOR = (255, 255, 255)
+# Color of the grid and path overlay layers that is left transparent
+OVERLAY_COLORKEY = (0, 0, 0)
+
+
+class StaticLayers:
+    """The cached static layers of the game screen.
+
+    The background layer holds the background color, and the obstacles of the map
+    when all objects are shown. It is rebuilt when the map or show_all changes. The
+    grid layer is transparent apart from the grid lines, and is rebuilt when the grid
+    division changes.
+
+    Attributes
+    ----------
+    screen_size : Tuple[int, int]
+        The size of the layers.
+    """
+    screen_size: Tuple[int, int]
+    _background: Optional[pg.Surface]
+    _background_map: Optional[GameMap]
+    _background_show_all: bool
+    _grid: Optional[pg.Surface]
+    _grid_div: Optional[int]
+
+    def __init__(self, screen_size: Tuple[int, int]) -> None:
+        self.screen_size = screen_size
+        self._background = None
+        self._background_map = None
+        self._background_show_all = False
+        self._grid = None
+        self._grid_div = None
+
+    def get_background(self, game_map: GameMap, show_all: bool) -> pg.Surface:
+        """Return the background layer of the given map"""
+        if self._background is None or self._background_map is not game_map or \
+                self._background_show_all != show_all:
+            self._background = _new_surface(self.screen_size)
+            self._background.fill(BACKGROUND_COLOR)
+            if show_all:
+                object_type = game_map.get_object_types()
+                for obstacle in game_map.get_obstacles():
+                    pg.draw.rect(self._background, object_type[obstacle[1]][0], obstacle[0])
+            self._background_map = game_map
+            self._background_show_all = show_all
+        return self._background
+
+    def get_grid(self, div: int) -> pg.Surface:
+        """Return the grid layer with div columns and rows"""
+        if self._grid is None or self._grid_div != div:
+            self._grid = _new_surface(self.screen_size)
+            self._grid.fill(OVERLAY_COLORKEY)
+            self._grid.set_colorkey(OVERLAY_COLORKEY)
+            draw_grid(self._grid, div, GRID_COLOR)
+            self._grid_div = div
+        return self._grid
+
+    def invalidate(self) -> None:
+        """Drops the cached layers, so they are rebuilt when next used"""
+        self._background = None
+        self._background_map = None
+        self._grid = None
+        self._grid_div = None
+
+
+class FogOfWar:
+    """The part of the map revealed by the vision field of the player.
+
+    Each visited position is only tested against the objects of the map once, when it
+    is first visited. Revealed obstacles are drawn onto a copy of the background layer,
+    and revealed treasures and fragments are remembered, as they can still be removed
+    from the map when found.
+
+    The revealed area is reset when the path, the map or the vision radius changes.
+    """
+    _layers: StaticLayers
+    _surface: Optional[pg.Surface]
+    _revealed: Set[Tuple[int, int, int, int]]
+    _path: Optional[Path]
+    _map: Optional[GameMap]
+    _vision_radius: int
+    _num_visited: int
+
+    def __init__(self, layers: StaticLayers) -> None:
+        self._layers = layers
+        self._surface = None
+        self._revealed = set()
+        self._path = None
+        self._map = None
+        self._vision_radius = 0
+        self._num_visited = 0
+
+    def update(self, game_map: GameMap, path: Path, vision_radius: int,
+               rect_size: Tuple[int, int]) -> List[pg.Rect]:
+        """Reveals the area around the positions visited since the last update, and
+        returns the rects of the newly revealed objects"""
+        if path is not self._path or game_map is not self._map or vision_radius != self._vision_radius:
+            self._surface = self._layers.get_background(game_map, False).copy()
+            self._revealed = set()
+            self._path = path
+            self._map = game_map
+            self._vision_radius = vision_radius
+            self._num_visited = 0
+
+        object_type = game_map.get_object_types()
+        vision_rect_size = (rect_size[0] + 2 * vision_radius, rect_size[1] + 2 * vision_radius)
+        revealed_rects = []
+        for pos in path.all_pos[self._num_visited:]:
+            vision_rect = pg.Rect((pos[0] - vision_radius, pos[1] - vision_radius), vision_rect_size)
+            for obstacle, obstacle_type in game_map.get_obstacles():
+                if tuple(obstacle) not in self._revealed and obstacle.colliderect(vision_rect):
+                    self._revealed.add(tuple(obstacle))
+                    revealed_rects.append(obstacle)
+                    pg.draw.rect(self._surface, object_type[obstacle_type][0], obstacle)
+            for rect in game_map.get_treasures() + game_map.get_fragments():
+                if tuple(rect) not in self._revealed and rect.colliderect(vision_rect):
+                    self._revealed.add(tuple(rect))
+                    revealed_rects.append(rect)
+        self._num_visited = len(path.all_pos)
+        return revealed_rects
+
+    def get_surface(self) -> pg.Surface:
+        """Return the background layer with the revealed obstacles drawn on it"""
+        return self._surface
+
+    def is_revealed(self, rect: pg.Rect) -> bool:
+        """Return whether the object at rect has been revealed"""
+        return tuple(rect) in self._revealed
+
+
+class PathOverlay:
+    """A transparent layer with the edges of one or more paths drawn on it.
+
+    The edges of each path are drawn once, listing each edge of its graph once. When
+    the same paths are drawn again, only the moves recorded since the last time are
+    added to the layer.
+
+    Attributes
+    ----------
+    screen_size : Tuple[int, int]
+        The size of the layer.
+    rect_size : Tuple[int, int]
+        The size of the player rect, as the edges are drawn between the centres of
+        the player positions.
+    """
+    screen_size: Tuple[int, int]
+    rect_size: Tuple[int, int]
+    _surface: Optional[pg.Surface]
+    _paths: List[Path]
+    _colors: List[pg.Color]
+    _num_moves: List[int]
+
+    def __init__(self, screen_size: Tuple[int, int], rect_size: Tuple[int, int]) -> None:
+        self.screen_size = screen_size
+        self.rect_size = rect_size
+        self._surface = None
+        self._paths = []
+        self._colors = []
+        self._num_moves = []
+
+    def get_surface(self, paths: List[Path], colors: List[pg.Color]) -> pg.Surface:
+        """Return the layer with each path drawn in the color of the same index, later
+        paths being drawn over earlier ones"""
+        if self._surface is None or len(paths) != len(self._paths) or colors != self._colors or \
+                any(path is not drawn for path, drawn in zip(paths, self._paths)):
+            self._surface = _new_surface(self.screen_size)
+            self._surface.fill(OVERLAY_COLORKEY)
+            self._surface.set_colorkey(OVERLAY_COLORKEY)
+            for path, color in zip(paths, colors):
+                for pos1, pos2 in path.get_graph().get_edges():
+                    self._draw_segment(color, pos1, pos2)
+            self._paths = list(paths)
+            self._colors = list(colors)
+            self._num_moves = [len(path.pos_record) for path in paths]
+        else:
+            for i, (path, color) in enumerate(zip(paths, colors)):
+                new_moves = path.pos_record[self._num_moves[i] - 1:]
+                for pos1, pos2 in zip(new_moves, new_moves[1:]):
+                    if pos1 != pos2:
+                        self._draw_segment(color, pos1, pos2)
+                self._num_moves[i] = len(path.pos_record)
+        return self._surface
+
+    def _draw_segment(self, color: pg.Color, pos1: Tuple[int, int], pos2: Tuple[int, int]) -> None:
+        """Draws the edge between two player positions"""
+        init_pos = (pos1[0] + self.rect_size[0] / 2, pos1[1] + self.rect_size[1] / 2)
+        end_pos = (pos2[0] + self.rect_size[0] / 2, pos2[1] + self.rect_size[1] / 2)
+        pg.draw.line(self._surface, color, init_pos, end_pos)
+
+
+class DirtyTracker:
+    """Tracks the regions of the screen changed since the last display update, so only
+    those regions are pushed to the display.
+
+    The whole display is updated when the tracker is invalidated, or when the state
+    given to check_state changes, such as the map or a display toggle.
+    """
+    _rects: List[pg.Rect]
+    _full: bool
+    _state: Optional[Tuple[Any, ...]]
+    _path: Optional[Path]
+    _num_moves: int
+    _rect_size: Tuple[int, int]
+
+    def __init__(self, rect_size: Tuple[int, int]) -> None:
+        self._rects = []
+        self._full = True
+        self._state = None
+        self._path = None
+        self._num_moves = 0
+        self._rect_size = rect_size
+
+    def add(self, rect: pg.Rect) -> None:
+        """Marks the region of rect as changed"""
+        self._rects.append(pg.Rect(rect))
+
+    def add_moves(self, path: Path) -> None:
+        """Marks the player positions recorded in path since the last call as changed,
+        along with the position before them"""
+        if path is not self._path:
+            self._path = path
+            self._num_moves = len(path.pos_record)
+            self._full = True
+            return
+        new_moves = path.pos_record[max(self._num_moves - 1, 0):]
+        for pos1, pos2 in zip(new_moves, new_moves[1:]):
+            # The rect covering both positions also covers the path segment drawn between them
+            move_rect = pg.Rect(pos1, self._rect_size).union(pg.Rect(pos2, self._rect_size))
+            self._rects.append(move_rect.inflate(2, 2))
+        self._num_moves = len(path.pos_record)
+
+    def check_state(self, state: Tuple[Any, ...]) -> None:
+        """Updates the whole display next time if state differs from the last state given"""
+        if state != self._state:
+            self._state = state
+            self._full = True
+
+    def invalidate(self) -> None:
+        """Updates the whole display next time"""
+        self._full = True
+
+    def update(self) -> None:
+        """Pushes the changed regions of the screen to the display"""
+        if self._full:
+            pg.display.flip()
+        elif self._rects:
+            pg.display.update(self._rects)
+        self._rects.clear()
+        self._full = False
+
+
+def draw_grid(surface: pg.Surface, div: int, color: Tuple[int, int, int]) -> None:
+    """Draws a square grid with div columns and rows on the given surface"""
+    width, height = surface.get_size()
+
+    for col in range(1, div):
+        x = col * (width // div)
+        pg.draw.line(surface, color, (x, 0), (x, height))
+
+    for row in range(1, div):
+        y = row * (height // div)
+        pg.draw.line(surface, color, (0, y), (width, y))
+
+
+def _new_surface(size: Tuple[int, int]) -> pg.Surface:
+    """Return a new surface, in the pixel format of the screen if it is set, so that
+    blitting it needs no conversion"""
+    surface = pg.Surface(size)
+    if pg.display.get_surface() is not None:
+        surface = surface.convert()
+    return surface
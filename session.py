@@ -0,0 +1,175 @@
+"""
+This file contains the session recorder, which streams the moves of the current game to
+disk while it is played, so an unfinished game can be recovered after a crash.
+
+The session file starts with a header holding the map, player and initial position of
+the game, followed by each recorded position as a pair of int16. Positions are handed
+to a background thread, which writes them in batches, so the game loop never waits on
+the disk.
+"""
+from typing import Optional, Tuple
+import os
+import queue
+import struct
+import threading
+import time
+from path import Path, Graph, PATH_DIR
+from journal import PathJournal
+
+SESSION_FILE = os.path.join(PATH_DIR, 'session.tps')
+SESSION_MAGIC = b'TSES'
+SESSION_VERSION = 1
+SESSION_HEADER = struct.Struct('<4sHIhhH')
+SESSION_MOVE = struct.Struct('<hh')
+# Unfinished games that are not resumed are archived in their own journal
+ARCHIVE_FILE = os.path.join(PATH_DIR, 'unfinished.tpj')
+ARCHIVE_INDEX_FILE = os.path.join(PATH_DIR, 'unfinished_index.csv')
+# Buffered moves are written at least this often (in seconds), or once MAX_BUFFERED
+# moves are waiting
+FLUSH_INTERVAL = 1.0
+MAX_BUFFERED = 256
+# Queued in place of a position to end the current game
+_FINISH = 'finish'
+
+
+class SessionRecorder:
+    """Records the moves of the current game to the session file from a background thread.
+
+    Attributes
+    ----------
+    session_file : str
+        The file the current game is recorded to.
+    flush_interval : float
+        The longest time in seconds a recorded move is buffered before it is written.
+    """
+    session_file: str
+    flush_interval: float
+    _queue: queue.SimpleQueue
+    _thread: threading.Thread
+
+    def __init__(self, session_file: Optional[str] = SESSION_FILE,
+                 flush_interval: Optional[float] = FLUSH_INTERVAL) -> None:
+        """Starts the writer thread of the recorder"""
+        self.session_file = session_file
+        self.flush_interval = flush_interval
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def start(self, path: Path) -> None:
+        """Starts recording a new game, continuing from the moves already in path
+
+        The session file is only replaced once the first new move is recorded, so an
+        unfinished game stays recoverable until a new game is actually played.
+        """
+        self._queue.put(_encode_session(path))
+
+    def record(self, pos: Tuple[int, int]) -> None:
+        """Records a new position of the current game, without waiting for it to be written"""
+        self._queue.put(pos)
+
+    def finish(self) -> None:
+        """Ends the current game once it is saved, removing the session file"""
+        self._queue.put(_FINISH)
+
+    def close(self) -> None:
+        """Writes the remaining moves and stops the writer thread"""
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self) -> None:
+        """Writes the queued moves to the session file until the recorder is closed
+
+        Each item of the queue is either a recorded position, the encoded start of a new
+        game, _FINISH to end the current game, or None to stop.
+        """
+        file = None
+        pending_start = None
+        buffer = bytearray()
+        last_flush = time.monotonic()
+        while True:
+            try:
+                item = self._queue.get(timeout=self.flush_interval if buffer else None)
+            except queue.Empty:
+                item = ()
+
+            if isinstance(item, tuple) and item:
+                if pending_start is not None:
+                    if file is not None:
+                        file.close()
+                    file = open(self.session_file, 'wb')
+                    buffer = bytearray(pending_start)
+                    pending_start = None
+                if file is not None:
+                    buffer += SESSION_MOVE.pack(*item)
+                if len(buffer) < MAX_BUFFERED * SESSION_MOVE.size and \
+                        time.monotonic() - last_flush < self.flush_interval:
+                    continue
+
+            if file is not None and buffer:
+                file.write(buffer)
+                file.flush()
+                os.fsync(file.fileno())
+            buffer.clear()
+            last_flush = time.monotonic()
+
+            if isinstance(item, bytes):
+                pending_start = item
+            elif item == _FINISH:
+                if file is not None:
+                    file.close()
+                    file = None
+                pending_start = None
+                if os.path.exists(self.session_file):
+                    os.remove(self.session_file)
+            elif item is None:
+                if file is not None:
+                    file.close()
+                return
+
+
+def read_session(session_file: Optional[str] = SESSION_FILE, graph: Optional[Graph] = None) -> Optional[Path]:
+    """Return the game recorded in the session file, or None if there is no recorded
+    game or it has no moves
+
+    A torn position at the end of the file, left by an interrupted write, is ignored.
+    """
+    if not os.path.exists(session_file):
+        return None
+    with open(session_file, 'rb') as file:
+        data = file.read()
+    if len(data) < SESSION_HEADER.size:
+        return None
+    magic, version, map_id, x, y, name_length = SESSION_HEADER.unpack_from(data)
+    if magic != SESSION_MAGIC or version != SESSION_VERSION:
+        return None
+    offset = SESSION_HEADER.size + name_length
+    player_id = data[SESSION_HEADER.size:offset].decode('utf-8', errors='replace')
+    num_moves = (len(data) - offset) // SESSION_MOVE.size
+    if num_moves <= 0:
+        return None
+
+    path = Path(initial_pos=(x, y), map_id=map_id, player_id=player_id, graph=graph)
+    for pos in SESSION_MOVE.iter_unpack(data[offset:offset + num_moves * SESSION_MOVE.size]):
+        path.update_path(pos)
+    return path
+
+
+def archive_session(path: Path) -> None:
+    """Saves an unfinished game that is not resumed to the journal of unfinished games"""
+    PathJournal(ARCHIVE_FILE, ARCHIVE_INDEX_FILE).append(path)
+
+
+def discard_session(session_file: Optional[str] = SESSION_FILE) -> None:
+    """Removes the session file, once the game recorded in it is saved elsewhere"""
+    if os.path.exists(session_file):
+        os.remove(session_file)
+
+
+def _encode_session(path: Path) -> bytes:
+    """Return the header of the session file for path, followed by the moves it already holds"""
+    player_id = str(path.get_player()).encode('utf-8')
+    header = SESSION_HEADER.pack(SESSION_MAGIC, SESSION_VERSION, path.get_map(), path.initial_pos[0],
+                                 path.initial_pos[1], len(player_id))
+    moves = b''.join(SESSION_MOVE.pack(*pos) for pos in path.pos_record[1:])
+    return header + player_id + moves
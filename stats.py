@@ -0,0 +1,107 @@
+"""
+This file contains the player statistics store, kept in an sqlite database.
+
+Each player has one row, keyed by player_id. A finished game is recorded with a single
+upsert, so only that player's row is touched, and games finished by two processes at
+once are both counted.
+"""
+from __future__ import annotations
+from typing import Dict, List, Optional
+import csv
+import os
+import sqlite3
+
+STATS_DB = 'player_stat.db'
+STATS_CSV = 'player_stat.csv'
+STATS_COLUMNS = ('player_id', 'games_played', 'vision_field', 'treasures')
+
+
+class PlayerStats:
+    """The statistics of all players, saved in an sqlite database.
+
+    Attributes
+    ----------
+    db_file : str
+        The sqlite database the statistics are saved in.
+    """
+    db_file: str
+    _connection: sqlite3.Connection
+
+    def __init__(self, db_file: Optional[str] = STATS_DB, import_file: Optional[str] = STATS_CSV) -> None:
+        """Opens the statistics database, creating it if it does not exist.
+
+        If the database is new and import_file exists, the statistics saved in
+        import_file are imported into it (see import_csv).
+        """
+        self.db_file = db_file
+        # Waits for other processes writing to the database instead of failing
+        self._connection = sqlite3.connect(db_file, timeout=10)
+        with self._connection:
+            is_new = self._connection.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'player_stats'").fetchone() is None
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS player_stats ('
+                'player_id TEXT PRIMARY KEY, '
+                'games_played INTEGER NOT NULL DEFAULT 0, '
+                'vision_field INTEGER NOT NULL, '
+                'treasures INTEGER NOT NULL DEFAULT 0)')
+        if is_new and import_file is not None and os.path.exists(import_file):
+            self.import_csv(import_file)
+
+    def __enter__(self) -> PlayerStats:
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def record_game(self, player_id: str, vision_field: int, treasures: int) -> None:
+        """Records a finished game of the player, in which the given number of
+        treasures were found"""
+        with self._connection:
+            self._record_game(player_id, vision_field, treasures)
+
+    def get_stats(self, player_id: str) -> Optional[Dict[str, int]]:
+        """Return the statistics of the player, or None if the player has no recorded games"""
+        row = self._connection.execute(
+            'SELECT games_played, vision_field, treasures FROM player_stats WHERE player_id = ?',
+            (player_id,)).fetchone()
+        if row is None:
+            return None
+        return dict(zip(STATS_COLUMNS[1:], row))
+
+    def get_players(self) -> List[str]:
+        """Return the ids of all players with recorded games"""
+        return [row[0] for row in self._connection.execute('SELECT player_id FROM player_stats ORDER BY player_id')]
+
+    def import_csv(self, csv_file: Optional[str] = STATS_CSV) -> int:
+        """Imports the statistics saved in csv_file, in the format of player_stat.csv, and
+        returns the number of players imported.
+
+        Players already in the database are overwritten, so importing the same file
+        twice does not count its games twice.
+        """
+        with open(csv_file, newline='') as file:
+            rows = [(row['player_id'], int(row['games_played']), int(row['vision_field']), int(row['treasures']))
+                    for row in csv.DictReader(file)]
+        with self._connection:
+            self._connection.executemany(
+                'INSERT INTO player_stats (player_id, games_played, vision_field, treasures) '
+                'VALUES (?, ?, ?, ?) '
+                'ON CONFLICT (player_id) DO UPDATE SET '
+                'games_played = excluded.games_played, vision_field = excluded.vision_field, '
+                'treasures = excluded.treasures',
+                rows)
+        return len(rows)
+
+    def close(self) -> None:
+        """Closes the database"""
+        self._connection.close()
+
+    def _record_game(self, player_id: str, vision_field: int, treasures: int) -> None:
+        """Records a finished game of the player, inside the caller's transaction"""
+        self._connection.execute(
+            'INSERT INTO player_stats (player_id, games_played, vision_field, treasures) '
+            'VALUES (?, 1, ?, ?) '
+            'ON CONFLICT (player_id) DO UPDATE SET '
+            'games_played = games_played + 1, treasures = treasures + excluded.treasures',
+            (player_id, vision_field, treasures))
@@ -0,0 +1,75 @@
+"""Tests for the map catalogue of catalogue.py"""
+import os
+import pytest
+from catalogue import CATALOGUE_FILE, MapCatalogue, pack_maps
+from game import Game
+from map import GameMap, reserve_map_ids
+
+SCREEN_SIZE = (800, 800)
+DIV = 40
+
+
+@pytest.fixture
+def maps(tmp_path, monkeypatch) -> list:
+    """Return three maps saved under a new directory 'maps', the last in the binary format"""
+    monkeypatch.chdir(tmp_path)
+    os.mkdir('maps')
+    os.mkdir('paths')
+    saved = []
+    for seed in (1, 2, 3):
+        game_map = GameMap(SCREEN_SIZE, DIV, True, 2, seed)
+        game_map.write_map(binary=seed == 3)
+        saved.append(game_map)
+    return saved
+
+
+def test_get_map_by_id(maps) -> None:
+    assert pack_maps() == 3
+    with MapCatalogue(CATALOGUE_FILE, SCREEN_SIZE, DIV) as catalogue:
+        assert len(catalogue) == 3
+        assert catalogue.map_ids() == [1, 2, 3]
+        for game_map in maps:
+            packed = catalogue.get_map(game_map.map_id)
+            assert packed.map_id == game_map.map_id
+            assert packed.fingerprint() == game_map.fingerprint()
+
+
+def test_missing_map_id(maps) -> None:
+    pack_maps()
+    with MapCatalogue(CATALOGUE_FILE, SCREEN_SIZE, DIV) as catalogue:
+        assert 4 not in catalogue
+        with pytest.raises(KeyError):
+            catalogue.get_map(4)
+        with pytest.raises(KeyError):
+            catalogue.get_map(0)
+
+
+def test_rejects_other_files(maps) -> None:
+    with pytest.raises(ValueError):
+        MapCatalogue(os.path.join('maps', 'map3.tmap'))
+
+
+def test_newer_map_file_is_preferred(maps) -> None:
+    pack_maps()
+    # Map 2 is saved again after packing, with another layout
+    replacement = GameMap(SCREEN_SIZE, DIV, True, 2, 4)
+    replacement.write_map(2, binary=True)
+    catalogue_mtime = os.path.getmtime(CATALOGUE_FILE)
+    os.utime(os.path.join('maps', 'map2.tmap'), (catalogue_mtime + 1, catalogue_mtime + 1))
+    os.remove(os.path.join('maps', 'map1.csv'))
+
+    game = Game(SCREEN_SIZE, DIV, False)
+    game.read()
+    assert game.get_map_ids() == [1, 2, 3]
+    # Map 1 is only left in the catalogue
+    assert game.get_map(1).fingerprint() == maps[0].fingerprint()
+    assert game.get_map(2).fingerprint() == replacement.fingerprint()
+    assert game.get_map(3).fingerprint() == maps[2].fingerprint()
+    game.close()
+
+
+def test_reserved_ids_follow_the_catalogue(maps) -> None:
+    pack_maps()
+    for map_id in (2, 3):
+        os.remove(os.path.join('maps', 'map{}.{}'.format(map_id, 'tmap' if map_id == 3 else 'csv')))
+    assert reserve_map_ids(2) == [4, 5]
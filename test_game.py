@@ -0,0 +1,69 @@
+"""Tests for the map and path index of game.py"""
+import os
+from typing import List, Tuple
+import pytest
+from game import Game
+from journal import PathJournal, RECORD_HEADER
+from path import Path
+
+
+@pytest.fixture
+def journal(tmp_path, monkeypatch) -> PathJournal:
+    """Return the path journal of a new directory 'paths'"""
+    monkeypatch.chdir(tmp_path)
+    os.mkdir('maps')
+    os.mkdir('paths')
+    return PathJournal()
+
+
+def _path(map_id: int, num_moves: int) -> Path:
+    """Return a path on the given map moving right num_moves times"""
+    path = Path((16, 396), map_id=map_id, player_id='Alice')
+    for i in range(1, num_moves + 1):
+        path.update_path((16 + 20 * i, 396))
+    return path
+
+
+def _read(monkeypatch) -> Tuple[Game, List[int]]:
+    """Return a game read from the current directory, and the path ids it loads"""
+    loaded = []
+    load_path = Game._load_path
+
+    def counting_load(self, entry) -> Path:
+        loaded.append(entry.path_id)
+        return load_path(self, entry)
+    monkeypatch.setattr(Game, '_load_path', counting_load)
+    game = Game(record_session=False)
+    game.read()
+    return game, loaded
+
+
+def test_map_paths_limit(journal, monkeypatch) -> None:
+    for num_moves in range(1, 6):
+        journal.append(_path(1, num_moves))
+    journal.append(_path(2, 9))
+
+    game, loaded = _read(monkeypatch)
+    assert [path.move_count for path in game.get_map_paths(1, 3)] == [1, 2, 3]
+    assert loaded == [1, 2, 3]
+    assert [path.move_count for path in game.get_map_paths(1)] == [1, 2, 3, 4, 5]
+    assert [path.move_count for path in game.get_map_paths(2, 3)] == [9]
+    assert game.get_map_paths(3, 3) == []
+    game.close()
+
+
+def test_map_paths_skip_corrupt_record(journal, monkeypatch, caplog) -> None:
+    journal.append(_path(1, 1))
+    corrupt = journal.append(_path(1, 2))
+    journal.append(_path(1, 3))
+    journal.append(_path(1, 4))
+    with open(journal.journal_file, 'r+b') as file:
+        file.seek(corrupt.offset + RECORD_HEADER.size)
+        file.write(b'\0')
+
+    game, _ = _read(monkeypatch)
+    assert [path.move_count for path in game.get_map_paths(1)] == [1, 3, 4]
+    # The corrupt path does not count towards the limit
+    assert [path.move_count for path in game.get_map_paths(1, 2)] == [1, 3]
+    assert 'Skipping saved path 2' in caplog.text
+    game.close()
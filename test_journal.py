@@ -0,0 +1,129 @@
+"""Tests for the path journal of journal.py"""
+import os
+import shutil
+import pytest
+from journal import PathJournal, JOURNAL_HEADER, RECORD_HEADER
+from path import Path
+
+
+def _path(map_id: int, player_id: str, num_moves: int) -> Path:
+    """Return a path on the given map moving right num_moves times"""
+    path = Path((16, 396), map_id=map_id, player_id=player_id)
+    for i in range(1, num_moves + 1):
+        path.update_path((16 + 20 * i, 396))
+    return path
+
+
+def _open(tmp_path) -> PathJournal:
+    """Return the journal saved under tmp_path"""
+    return PathJournal(str(tmp_path / 'journal.tpj'), str(tmp_path / 'journal_index.csv'))
+
+
+def _moves(journal: PathJournal, entry) -> int:
+    """Return the number of moves of the path saved in the given record"""
+    path = Path((0, 0))
+    path.load_bytes(journal.read(entry))
+    return path.move_count
+
+
+def test_open_missing_journal_writes_nothing(tmp_path) -> None:
+    journal = _open(tmp_path)
+    assert len(journal) == 0
+    assert journal.compact() == 0
+    assert os.listdir(tmp_path) == []
+
+
+def test_append_and_reopen(tmp_path) -> None:
+    journal = _open(tmp_path)
+    journal.append(_path(1, 'Alice', 3))
+    journal.append(_path(2, 'Bob', 5))
+    journal.append(_path(1, 'Bob', 7))
+
+    reopened = _open(tmp_path)
+    assert [(e.map_id, e.player_id) for e in reopened.get_entries()] == [(1, 'Alice'), (2, 'Bob'), (1, 'Bob')]
+    assert [_moves(reopened, e) for e in reopened.get_entries(1)] == [3, 7]
+    assert reopened.get_entries(3) == []
+
+
+def test_reopen_without_index(tmp_path) -> None:
+    journal = _open(tmp_path)
+    journal.append(_path(1, 'Alice', 3))
+    journal.append(_path(2, 'Bob', 5))
+    os.remove(journal.index_file)
+
+    reopened = _open(tmp_path)
+    assert reopened.get_entries() == journal.get_entries()
+    reopened.append(_path(3, 'Carol', 1))
+    assert [e.map_id for e in _open(tmp_path).get_entries()] == [1, 2, 3]
+
+
+def test_corrupt_record_fails_checksum(tmp_path) -> None:
+    journal = _open(tmp_path)
+    journal.append(_path(1, 'Alice', 3))
+    corrupt = journal.append(_path(2, 'Bob', 5))
+    journal.append(_path(3, 'Carol', 7))
+
+    with open(journal.journal_file, 'r+b') as file:
+        file.seek(corrupt.offset + corrupt.length + RECORD_HEADER.size - 1)
+        last_byte = file.read(1)
+        file.seek(-1, os.SEEK_CUR)
+        file.write(bytes([last_byte[0] ^ 0xFF]))
+
+    reopened = _open(tmp_path)
+    with pytest.raises(ValueError):
+        reopened.read(reopened.get_entries(2)[0])
+    assert reopened.compact() == 1
+    assert [_moves(reopened, e) for e in reopened.get_entries()] == [3, 7]
+
+
+def test_torn_record_is_cut_off(tmp_path) -> None:
+    journal = _open(tmp_path)
+    journal.append(_path(1, 'Alice', 3))
+    torn = journal.append(_path(2, 'Bob', 5))
+    os.remove(journal.index_file)
+    os.truncate(journal.journal_file, torn.offset + RECORD_HEADER.size + 2)
+
+    reopened = _open(tmp_path)
+    assert [e.map_id for e in reopened.get_entries()] == [1]
+    assert os.path.getsize(journal.journal_file) == torn.offset
+    reopened.append(_path(3, 'Carol', 7))
+    assert [_moves(reopened, e) for e in _open(tmp_path).get_entries()] == [3, 7]
+
+
+def test_scan_resumes_after_corrupt_header(tmp_path) -> None:
+    journal = _open(tmp_path)
+    journal.append(_path(1, 'Alice', 3))
+    corrupt = journal.append(_path(2, 'Bob', 5))
+    journal.append(_path(3, 'Carol', 7))
+    os.remove(journal.index_file)
+    with open(journal.journal_file, 'r+b') as file:
+        file.seek(corrupt.offset)
+        file.write(b'XXXX')
+
+    reopened = _open(tmp_path)
+    assert [e.map_id for e in reopened.get_entries()] == [1, 3]
+    # Records appended after the corrupt one are still found when the journal is reopened
+    reopened.append(_path(4, 'Dave', 9))
+    os.remove(journal.index_file)
+    assert [_moves(reopened, e) for e in _open(tmp_path).get_entries()] == [3, 7, 9]
+
+
+def test_compaction_starts_a_new_generation(tmp_path) -> None:
+    journal = _open(tmp_path)
+    for i in range(4):
+        journal.append(_path(i + 1, 'Alice', i + 1))
+    stale_index = str(tmp_path / 'stale_index.csv')
+    shutil.copy(journal.index_file, stale_index)
+
+    with open(journal.journal_file, 'r+b') as file:
+        file.seek(journal.get_entries()[1].offset + RECORD_HEADER.size)
+        file.write(b'\0')
+    assert journal.compact() == 1
+    with open(journal.journal_file, 'rb') as file:
+        assert JOURNAL_HEADER.unpack(file.read(JOURNAL_HEADER.size))[1] == 1
+
+    # An index written for the old generation is not trusted with the new journal
+    shutil.copy(stale_index, journal.index_file)
+    reopened = _open(tmp_path)
+    assert [e.map_id for e in reopened.get_entries()] == [1, 3, 4]
+    assert [_moves(reopened, e) for e in reopened.get_entries()] == [1, 3, 4]
@@ -0,0 +1,71 @@
+"""Tests for map generation and the map formats of map.py"""
+import os
+import pytest
+from map import GameMap, MAP_HEADER, MAP_MAGIC
+
+SCREEN_SIZE = (800, 800)
+DIV = 40
+
+
+def _new_map() -> GameMap:
+    """Return an empty map, to load a saved map into"""
+    return GameMap(SCREEN_SIZE, DIV, False)
+
+
+def _assert_same_layout(loaded: GameMap, game_map: GameMap) -> None:
+    """Assert that loaded holds the same settings and objects as game_map"""
+    assert loaded.get_difficulty() == game_map.get_difficulty()
+    assert loaded.get_object_info() == game_map.get_object_info()
+    assert loaded.fingerprint() == game_map.fingerprint()
+    assert loaded.get_obstacles() == game_map.get_obstacles()
+    assert loaded.get_fragments() == game_map.get_fragments()
+    assert loaded.get_treasures() == game_map.get_treasures()
+
+
+@pytest.mark.parametrize('seed', [1, 2])
+def test_binary_round_trip(seed: int) -> None:
+    game_map = GameMap(SCREEN_SIZE, DIV, True, 3, seed)
+    loaded = _new_map()
+    loaded.load_bytes(game_map.to_bytes())
+    _assert_same_layout(loaded, game_map)
+
+
+@pytest.mark.parametrize('binary', [False, True])
+def test_write_map_round_trip(tmp_path, monkeypatch, binary: bool) -> None:
+    monkeypatch.chdir(tmp_path)
+    os.mkdir('maps')
+    game_map = GameMap(SCREEN_SIZE, DIV, True, 2, 5)
+    game_map.write_map(binary=binary)
+    game_map.write_map(binary=binary)
+    assert game_map.map_id == 2
+    # No temporary file is left next to the written maps
+    assert sorted(os.listdir('maps')) == ['map1.{}'.format('tmap' if binary else 'csv'),
+                                          'map2.{}'.format('tmap' if binary else 'csv')]
+
+    loaded = _new_map()
+    loaded.read_map('map2')
+    assert loaded.map_id == 2
+    _assert_same_layout(loaded, game_map)
+
+
+def test_load_bytes_rejects_other_data() -> None:
+    data = GameMap(SCREEN_SIZE, DIV, True, 2, 1).to_bytes()
+    with pytest.raises(ValueError, match='too short'):
+        _new_map().load_bytes(data[:MAP_HEADER.size - 1])
+    # A header whose rects were cut off
+    with pytest.raises(ValueError, match='too short'):
+        _new_map().load_bytes(data[:-2])
+    with pytest.raises(ValueError, match='version'):
+        _new_map().load_bytes(MAP_HEADER.pack(MAP_MAGIC, 2, *MAP_HEADER.unpack_from(data)[2:]) +
+                              data[MAP_HEADER.size:])
+    with pytest.raises(ValueError, match='version'):
+        _new_map().load_bytes(b'XXXX' + data[4:])
+    with pytest.raises(ValueError, match='screen'):
+        GameMap((400, 400), 20, False).load_bytes(data)
+
+
+def test_too_small_map_fails_at_once(monkeypatch) -> None:
+    # A map with fewer positions than objects is rejected before any layout is generated
+    monkeypatch.setattr(GameMap, 'generate_obstacles', lambda self: pytest.fail('layout generated'))
+    with pytest.raises(ValueError, match='positions on the map'):
+        GameMap(SCREEN_SIZE, 8, True, 5, 1)
@@ -0,0 +1,193 @@
+"""Tests for the graph backends and the compact path format of path.py"""
+from typing import Dict, List, Set, Tuple
+import heapq
+import struct
+import pytest
+from map import GameMap
+from path import Graph, CompactGraph, Path, PATH_HEADER, PATH_MAGIC, PATH_RUN_COUNT
+
+SCREEN_SIZE = (800, 800)
+DIV = 40
+RECT_SIZE = (8, 8)
+
+
+def _general_path(game_map: GameMap, graph: Graph) -> Path:
+    """Return the general path of game_map, recorded in graph"""
+    general_path = Path(game_map.get_start_pos(RECT_SIZE), graph=graph)
+    general_path.set_general_paths(game_map, RECT_SIZE)
+    return general_path
+
+
+def _partition(components: Dict[Tuple[int, int], int]) -> Set[frozenset]:
+    """Return the connected components as sets of positions, ignoring their labels"""
+    groups = {}
+    for pos, label in components.items():
+        groups.setdefault(label, set()).add(pos)
+    return {frozenset(group) for group in groups.values()}
+
+
+def _is_walk(graph: Graph, walk: List[Tuple[int, int]]) -> bool:
+    """Return whether each pair of consecutive positions of walk is an edge of graph"""
+    return all(graph.get_vertex(pos2) in graph.get_vertex(pos1).neighbours
+               for pos1, pos2 in zip(walk, walk[1:]))
+
+
+@pytest.mark.parametrize('seed', [1, 2, 3])
+def test_compact_graph_matches_graph(seed: int) -> None:
+    game_map = GameMap(SCREEN_SIZE, DIV, True, 3, seed)
+    path = _general_path(game_map, Graph())
+    compact_path = _general_path(game_map, CompactGraph.for_grid(SCREEN_SIZE, DIV, RECT_SIZE))
+    graph, compact_graph = path.get_graph(), compact_path.get_graph()
+
+    assert graph.length() == compact_graph.length()
+    assert sorted(graph.get_edges()) == sorted(compact_graph.get_edges())
+    assert _partition(graph.connected_components()) == _partition(compact_graph.connected_components())
+
+    start = game_map.get_start_pos(RECT_SIZE)
+    for rect in game_map.get_fragments() + game_map.get_treasures():
+        target = (int(rect.centerx - RECT_SIZE[0] / 2), int(rect.centery - RECT_SIZE[1] / 2))
+        if not graph.has_vertex(target):
+            assert not compact_graph.has_vertex(target)
+            with pytest.raises(ValueError):
+                compact_path.shortest_path(start, target)
+            continue
+        walk = path.shortest_path(start, target)
+        compact_walk = compact_path.shortest_path(start, target)
+        if walk is None:
+            assert compact_walk is None
+            continue
+        # Shortest paths of equal length may take different turns in each backend
+        assert len(walk) == len(compact_walk)
+        assert compact_walk[0] == start and compact_walk[-1] == target
+        assert _is_walk(graph, compact_walk) and _is_walk(compact_graph, walk)
+
+
+def _layout_path(obstacles: List[Tuple[Tuple[int, ...], str]]) -> Path:
+    """Return the weighted general path of a map holding only the given obstacles"""
+    game_map = GameMap(SCREEN_SIZE, DIV, False, 1)
+    game_map.set_object_info(obstacles, [], [])
+    general_path = Path(game_map.get_start_pos(RECT_SIZE), graph=CompactGraph.for_grid(SCREEN_SIZE, DIV, RECT_SIZE))
+    general_path.set_general_paths(game_map, RECT_SIZE, True)
+    return general_path
+
+
+def _walk_cost(path: Path, walk: List[Tuple[int, int]]) -> float:
+    """Return the cost of moving along walk"""
+    return sum(path.get_cost(pos1, pos2) for pos1, pos2 in zip(walk, walk[1:]))
+
+
+def _cheapest_cost(path: Path, start: Tuple[int, int], goal: Tuple[int, int]) -> float:
+    """Return the cost of the cheapest path from start to goal, found with Dijkstra's algorithm"""
+    distances = {start: 0}
+    heap = [(0, start)]
+    while heap:
+        distance, pos = heapq.heappop(heap)
+        if pos == goal:
+            return distance
+        if distance > distances[pos]:
+            continue
+        for neighbour in path.get_graph().get_vertex(pos).neighbours:
+            new_distance = distance + path.get_cost(pos, neighbour.pos)
+            if new_distance < distances.get(neighbour.pos, float('inf')):
+                distances[neighbour.pos] = new_distance
+                heapq.heappush(heap, (new_distance, neighbour.pos))
+    return float('inf')
+
+
+def test_a_star_goes_around_costly_terrain() -> None:
+    # A short river between the start and the goal, which is cheaper to walk around than to cross
+    general_path = _layout_path([((200, 360, 40, 80), 'river')])
+    start, goal = (16, 396), (296, 396)
+
+    shortest = general_path.shortest_path(start, goal)
+    cheapest = general_path.a_star(start, goal, (20, 20))
+    assert cheapest[0] == start and cheapest[-1] == goal
+    assert _is_walk(general_path.get_graph(), cheapest)
+    assert len(cheapest) > len(shortest)
+    # The cheapest path never enters the river
+    assert all(general_path.get_cost(pos, pos) == 1 for pos in cheapest)
+    assert _walk_cost(general_path, cheapest) < _walk_cost(general_path, shortest)
+    assert _walk_cost(general_path, cheapest) == _cheapest_cost(general_path, start, goal)
+
+
+def test_a_star_crosses_terrain_when_cheapest() -> None:
+    # A river across the whole screen can only be crossed
+    general_path = _layout_path([((200, 0, 40, 800), 'river')])
+    start, goal = (16, 396), (296, 396)
+
+    cheapest = general_path.a_star(start, goal, (20, 20))
+    assert len(cheapest) == len(general_path.shortest_path(start, goal))
+    assert _walk_cost(general_path, cheapest) == _cheapest_cost(general_path, start, goal)
+
+
+def test_a_star_unreachable_goal() -> None:
+    # A rock wall across the whole screen cannot be crossed
+    general_path = _layout_path([((200, 0, 40, 800), 'rock')])
+    assert general_path.a_star((16, 396), (296, 396), (20, 20)) is None
+    with pytest.raises(ValueError):
+        general_path.a_star((16, 396), (216, 396), (20, 20))
+
+
+def test_compact_graph_has_vertex() -> None:
+    graph = CompactGraph.for_grid(SCREEN_SIZE, DIV, RECT_SIZE)
+    graph.add_vertex((16, 396))
+    assert graph.has_vertex((16, 396))
+    assert not graph.has_vertex((36, 396))
+    # Positions off the grid are never vertices
+    assert not graph.has_vertex((17, 396))
+    assert not graph.has_vertex((-100, 396))
+    with pytest.raises(KeyError):
+        graph.get_vertex((36, 396))
+
+
+def _new_path() -> Path:
+    """Return an empty path on map 3, recorded in a compact graph"""
+    return Path((16, 396), map_id=3, player_id='Alice',
+                graph=CompactGraph.for_grid(SCREEN_SIZE, DIV, RECT_SIZE))
+
+
+def test_compact_path_round_trip() -> None:
+    path = _new_path()
+    moves = [(36, 396), (56, 396), (76, 396), (76, 396), (76, 376), (76, 356), (56, 356), (56, 356),
+             (56, 356), (56, 376)]
+    for pos in moves:
+        path.update_path(pos)
+
+    loaded = _new_path()
+    loaded.load_bytes(path.to_bytes())
+    assert loaded.get_player() == 'Alice'
+    assert loaded.get_map() == 3
+    assert loaded.initial_pos == path.initial_pos
+    # Moves that stay in place are kept, so the move count is restored
+    assert loaded.move_count == path.move_count == len(moves)
+    assert loaded.pos_record == path.pos_record
+    assert loaded.all_pos == path.all_pos
+    assert sorted(loaded.get_graph().get_edges()) == sorted(path.get_graph().get_edges())
+
+
+def test_compact_path_long_run() -> None:
+    path = _new_path()
+    for _ in range(20000):
+        path.update_path((16, 396))
+    loaded = _new_path()
+    loaded.load_bytes(path.to_bytes())
+    assert loaded.move_count == 20000
+
+
+def test_compact_path_reads_version_1() -> None:
+    # Version 1 held the direction code in the lowest 2 bits of each run
+    player_id = b'Bob'
+    runs = [(3 << 2) | 1, (2 << 2) | 2]
+    data = PATH_HEADER.pack(PATH_MAGIC, 1, 2, 16, 396, 20, 20, len(player_id)) + player_id + \
+        PATH_RUN_COUNT.pack(len(runs)) + struct.pack('<2H', *runs)
+    loaded = _new_path()
+    loaded.load_bytes(data)
+    assert loaded.get_player() == 'Bob'
+    assert loaded.pos_record == [(16, 396), (36, 396), (56, 396), (76, 396), (76, 376), (76, 356)]
+
+
+def test_compact_path_rejects_other_data() -> None:
+    with pytest.raises(ValueError):
+        _new_path().load_bytes(b'TPTH')
+    with pytest.raises(ValueError):
+        _new_path().load_bytes(PATH_HEADER.pack(b'XXXX', 2, 1, 0, 0, 20, 20, 0) + PATH_RUN_COUNT.pack(0))
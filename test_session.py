@@ -0,0 +1,142 @@
+"""Tests for the session recorder of session.py"""
+import os
+import time
+import pytest
+from game import Game
+from journal import PathJournal
+from path import Path
+from session import SessionRecorder, ARCHIVE_FILE, ARCHIVE_INDEX_FILE, MAX_BUFFERED, SESSION_FILE, \
+    SESSION_HEADER, SESSION_MOVE, read_session, _encode_session
+
+
+def _path(player_id: str, num_moves: int) -> Path:
+    """Return a path on map 1 moving right num_moves times"""
+    path = Path((16, 396), map_id=1, player_id=player_id)
+    for i in range(1, num_moves + 1):
+        path.update_path((16 + 20 * i, 396))
+    return path
+
+
+def _record(recorder: SessionRecorder, path: Path, num_moves: int) -> None:
+    """Records num_moves more moves right of the last position of path"""
+    path.set_recorder(recorder.record)
+    for _ in range(num_moves):
+        x, y = path.pos_record[-1]
+        path.update_path((x + 20, y))
+
+
+def test_close_writes_buffered_moves(tmp_path) -> None:
+    session_file = str(tmp_path / 'session.tps')
+    # Moves are only written when the recorder is closed, as the flush interval is never reached
+    recorder = SessionRecorder(session_file, flush_interval=60)
+    path = _path('Alice', 0)
+    recorder.start(path)
+    _record(recorder, path, 5)
+    recorder.close()
+
+    recovered = read_session(session_file)
+    assert recovered.get_player() == 'Alice'
+    assert recovered.get_map() == 1
+    assert recovered.pos_record == path.pos_record
+
+
+def _wait_for_moves(session_file: str, num_moves: int) -> bool:
+    """Return whether at least num_moves moves are written to the session file within 5 seconds"""
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        recovered = read_session(session_file)
+        if recovered is not None and recovered.move_count >= num_moves:
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_full_buffer_is_written_at_once(tmp_path) -> None:
+    session_file = str(tmp_path / 'session.tps')
+    recorder = SessionRecorder(session_file, flush_interval=60)
+    path = _path('Alice', 0)
+    recorder.start(path)
+    _record(recorder, path, MAX_BUFFERED)
+    # The buffer holds the header as well, so its last moves wait for the next batch
+    assert _wait_for_moves(session_file, MAX_BUFFERED - SESSION_HEADER.size)
+    recorder.close()
+    assert read_session(session_file).move_count == MAX_BUFFERED
+
+
+def test_moves_are_written_after_flush_interval(tmp_path) -> None:
+    session_file = str(tmp_path / 'session.tps')
+    recorder = SessionRecorder(session_file, flush_interval=0.05)
+    path = _path('Alice', 0)
+    recorder.start(path)
+    _record(recorder, path, 3)
+    assert _wait_for_moves(session_file, 3)
+    recorder.close()
+
+
+def test_start_keeps_session_until_first_move(tmp_path) -> None:
+    session_file = str(tmp_path / 'session.tps')
+    recorder = SessionRecorder(session_file)
+    first = _path('Alice', 0)
+    recorder.start(first)
+    _record(recorder, first, 4)
+    # A new game replaces the recorded one only once it has a move
+    second = _path('Bob', 0)
+    recorder.start(second)
+    recorder.close()
+    assert read_session(session_file).get_player() == 'Alice'
+
+    recorder = SessionRecorder(session_file)
+    recorder.start(second)
+    _record(recorder, second, 2)
+    recorder.close()
+    assert read_session(session_file).get_player() == 'Bob'
+
+
+def test_finish_removes_session_after_pending_moves(tmp_path) -> None:
+    session_file = str(tmp_path / 'session.tps')
+    recorder = SessionRecorder(session_file, flush_interval=60)
+    path = _path('Alice', 0)
+    recorder.start(path)
+    _record(recorder, path, 3)
+    recorder.finish()
+    recorder.close()
+    assert not os.path.exists(session_file)
+    assert read_session(session_file) is None
+
+
+def test_read_session_ignores_torn_move(tmp_path) -> None:
+    session_file = tmp_path / 'session.tps'
+    data = _encode_session(_path('Alice', 3))
+    session_file.write_bytes(data[:-1])
+    recovered = read_session(str(session_file))
+    assert recovered.pos_record == _path('Alice', 2).pos_record
+
+    # A header without any complete move holds no game
+    session_file.write_bytes(data[:SESSION_HEADER.size + len('Alice') + SESSION_MOVE.size - 1])
+    assert read_session(str(session_file)) is None
+    session_file.write_bytes(b'XXXX' + data[4:])
+    assert read_session(str(session_file)) is None
+
+
+@pytest.mark.parametrize('player_id', ['Alice', 'Default'])
+def test_unresumed_session_is_removed(tmp_path, monkeypatch, player_id: str) -> None:
+    # The game is either played by another player, or on a map that does not exist
+    monkeypatch.chdir(tmp_path)
+    os.mkdir('maps')
+    os.mkdir('paths')
+    with open(SESSION_FILE, 'wb') as file:
+        file.write(_encode_session(_path(player_id, 3)))
+
+    game = Game()
+    game.read()
+    assert game.unfinished_path is not None
+    assert not game.resume_session()
+    game.close()
+    assert not os.path.exists(SESSION_FILE)
+    assert len(PathJournal(ARCHIVE_FILE, ARCHIVE_INDEX_FILE)) == 1
+
+    # The archived game is not found again on the next start
+    game = Game()
+    game.read()
+    assert game.unfinished_path is None
+    game.close()
@@ -0,0 +1,50 @@
+"""Tests for the player statistics store of stats.py"""
+import sqlite3
+import pytest
+from stats import PlayerStats
+from leaderboard import Leaderboard
+
+STATS_ROWS = 'player_id,games_played,vision_field,treasures\nAlice,3,20,7\nBob,1,30,2\n'
+
+
+def test_record_game_counts_wins(tmp_path) -> None:
+    with PlayerStats(str(tmp_path / 'stats.db'), None) as stats:
+        stats.record_game('Alice', 20, 2)
+        stats.record_game('Alice', 20, 3)
+        assert stats.get_stats('Alice') == {'games_played': 2, 'vision_field': 20, 'treasures': 5}
+        assert stats.get_stats('Bob') is None
+        assert stats.get_players() == ['Alice']
+
+
+def test_new_database_imports_csv(tmp_path) -> None:
+    csv_file = tmp_path / 'player_stat.csv'
+    csv_file.write_text(STATS_ROWS)
+    db_file = str(tmp_path / 'stats.db')
+
+    with PlayerStats(db_file, str(csv_file)) as stats:
+        assert stats.get_players() == ['Alice', 'Bob']
+        assert stats.get_stats('Alice') == {'games_played': 3, 'vision_field': 20, 'treasures': 7}
+        assert stats.get_stats('Bob') == {'games_played': 1, 'vision_field': 30, 'treasures': 2}
+        stats.record_game('Bob', 30, 4)
+
+    # The csv is only imported into a new database, and importing it again overwrites the rows
+    with PlayerStats(db_file, str(csv_file)) as stats:
+        assert stats.get_stats('Bob') == {'games_played': 2, 'vision_field': 30, 'treasures': 6}
+        assert stats.import_csv(str(csv_file)) == 2
+        assert stats.get_stats('Bob') == {'games_played': 1, 'vision_field': 30, 'treasures': 2}
+
+
+def test_record_win_is_atomic(tmp_path, monkeypatch) -> None:
+    with Leaderboard(str(tmp_path / 'stats.db'), None) as leaderboard:
+        leaderboard.record_win('Alice', 20, 2, 1, 40)
+        assert leaderboard.get_stats('Alice')['games_played'] == 1
+        assert leaderboard.get_player_history('Alice') == [(1, 40)]
+
+        def fail(*args) -> None:
+            raise sqlite3.OperationalError('disk I/O error')
+        monkeypatch.setattr(leaderboard, '_add_game', fail)
+        with pytest.raises(sqlite3.OperationalError):
+            leaderboard.record_win('Alice', 20, 2, 1, 30)
+        # The statistics update is rolled back with the failed leaderboard update
+        assert leaderboard.get_stats('Alice')['games_played'] == 1
+        assert leaderboard.get_player_history('Alice') == [(1, 40)]